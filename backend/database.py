@@ -1,16 +1,114 @@
 # database.py
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
 
 DB_PATH = "./data/restaurants.db"  # relative to API_endpoints/
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON;")
+# Per-connection settings. journal_mode=WAL is persistent in the DB file, so it is
+# applied once in init_db; synchronous=NORMAL is only durable-safe under WAL.
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA cache_size = -64000;",  # ~64MB page cache
+    "PRAGMA mmap_size = 268435456;",  # 256MB
+)
+
+# API connection pool: at most POOL_SIZE connections are checked out at once, so
+# request threads read concurrently under WAL instead of queueing on one handle.
+POOL_SIZE = 5
+_idle_conns = queue.LifoQueue()  # LIFO hands back the connection with the warmest page cache
+_pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+# SQLite allows one writer at a time; queue writers here rather than on SQLITE_BUSY.
+_write_lock = threading.Lock()
+
+def get_db(check_same_thread: bool = True):
+    # timeout doubles as busy_timeout (ms) for lock waits; a larger statement
+    # cache keeps the hot endpoint queries prepared on long-lived connections.
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=5.0,
+        check_same_thread=check_same_thread,
+        cached_statements=256,
+    )
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     conn.row_factory = sqlite3.Row
     return conn
 
+# Restaurant inserts (API ingest and data_ingestion) extend the FTS5 / R*Tree indexes
+# explicitly; a trigger would trip the legacy FK (see _init_restaurant_search).
+LAST_RESTAURANT_ID_SQL = "SELECT COALESCE(MAX(id), 0) FROM restaurants"
+RESTAURANT_INDEX_TABLES_SQL = """
+    SELECT name FROM sqlite_master
+    WHERE type = 'table' AND name IN ('restaurants_fts', 'restaurants_rtree')
+"""
+INDEX_NEW_RESTAURANTS_SQL = "INSERT INTO restaurants_fts(rowid, name) SELECT id, name FROM restaurants WHERE id > ?"
+INDEX_NEW_LOCATIONS_SQL = """
+    INSERT INTO restaurants_rtree (id, min_lat, max_lat, min_lng, max_lng)
+    SELECT id, latitude, latitude, longitude, longitude FROM restaurants WHERE id > ?
+"""
+
+def last_restaurant_id(conn) -> int:
+    """MAX(restaurants.id); read it inside the insert's write transaction."""
+    return conn.execute(LAST_RESTAURANT_ID_SQL).fetchone()[0]
+
+def index_new_restaurants(conn, last_id: int):
+    """
+    Add restaurants with id > last_id to the search (FTS5) and location (R*Tree)
+    indexes, so new rows are searchable and recommendable without a restart.
+    New rowids always land past the previous MAX(id), so with last_id read in the
+    same write transaction exactly that batch is indexed. An index whose table
+    doesn't exist yet is skipped; init_db builds it from the full table.
+    """
+    existing = {row[0] for row in conn.execute(RESTAURANT_INDEX_TABLES_SQL)}
+    if "restaurants_fts" in existing:
+        conn.execute(INDEX_NEW_RESTAURANTS_SQL, (last_id,))
+    if "restaurants_rtree" in existing:
+        conn.execute(INDEX_NEW_LOCATIONS_SQL, (last_id,))
+
+def open_shared_db():
+    """Pre-open one pooled connection so the first request doesn't pay for it (lifespan)."""
+    with shared_db():
+        pass
+
+def close_shared_db():
+    """Close idle pooled connections (lifespan shutdown)."""
+    while True:
+        try:
+            conn = _idle_conns.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+
+@contextmanager
+def shared_db(write: bool = False):
+    """
+    Borrow a pooled connection for one unit of work.
+    Blocks while POOL_SIZE connections are in use; commits on success, rolls back on error.
+    write=True serializes writers in-process (before a connection is checked out, so
+    waiting writers don't starve readers of pool slots) and opens the transaction
+    with BEGIN IMMEDIATE so the SQLite write lock is taken upfront.
+    """
+    with _write_lock if write else nullcontext():
+        with _pool_slots:
+            try:
+                conn = _idle_conns.get_nowait()
+            except queue.Empty:
+                conn = get_db(check_same_thread=False)
+            try:
+                with conn:
+                    if write:
+                        conn.execute("BEGIN IMMEDIATE")
+                    yield conn
+            finally:
+                _idle_conns.put(conn)
+
 def init_db():
     conn = get_db()
+    conn.execute("PRAGMA journal_mode = WAL;")
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -95,9 +193,65 @@ def init_db():
                 REFERENCES ratings(user_id, restaurant_id, list_id)
         )
     """)    
+    # Startup discovery purge: prefix LIKE on name (NOCASE so LIKE can use it),
+    # created_at cutoff, then list_id deletes on the rating tables.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lists_name ON lists(name COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lists_created ON lists(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ratings_list ON ratings(list_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_processed_ratings_list ON processed_ratings(list_id)")
+    # /lists: active lists by name (equality on user_id + deleted_at IS NULL, so no sort);
+    # /lists/deleted and the 30-day purge: partial index over soft-deleted lists only.
+    # list_restaurants needs none: its PK already leads with list_id.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lists_user_active ON lists(user_id, deleted_at, name)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_lists_user_deleted ON lists(user_id, deleted_at DESC)
+        WHERE deleted_at IS NOT NULL
+    """)
+    # The restaurants table is created by data_ingestion; its indexes wait for it.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'restaurants'")
+    if cursor.fetchone():
+        _init_restaurant_search(cursor)
+        _init_restaurant_rtree(cursor)
     conn.commit()
     conn.close()
 
+def _init_restaurant_search(cursor):
+    """
+    FTS5 index over restaurants.name (external content).
+    Sync is explicit rather than trigger-based: any AFTER INSERT trigger on
+    restaurants trips the legacy synthetic_attributes FK (it references a
+    non-existent restaurants.place_id). Rebuilding here picks up any rows written
+    around it; the ingest endpoint and data_ingestion index their own inserts
+    through index_new_restaurants.
+    """
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_fts USING fts5(
+            name,
+            content='restaurants',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute("INSERT INTO restaurants_fts(restaurants_fts) VALUES ('rebuild')")
+
+def _init_restaurant_rtree(cursor):
+    """
+    R*Tree over restaurant locations (each a zero-area box) for the candidate
+    bounding-box lookup. Synced like restaurants_fts: rebuilt here, extended by
+    index_new_restaurants after each ingest batch.
+    R*Tree stores float32 bounds rounded outward, so box queries never miss a row.
+    """
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_rtree USING rtree(
+            id, min_lat, max_lat, min_lng, max_lng
+        )
+    """)
+    cursor.execute("DELETE FROM restaurants_rtree")
+    cursor.execute("""
+        INSERT INTO restaurants_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT id, latitude, latitude, longitude, longitude FROM restaurants
+    """)
+
 # For personal reference:
 # python -m http.server 8080 - to serve frontend
 # uvicorn API_endpoints.main:app --reload --port 8000 - to serve backend
@@ -1,80 +1,100 @@
 # lifespan.py
-import subprocess
+import asyncio
 import sys
 from pathlib import Path
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from datetime import datetime, timedelta, timezone
-from .database import get_db
+from .database import shared_db, open_shared_db, close_shared_db
 from .recommendation_engine import reload_model_artifacts
 
+# Purge ids are staged in a per-connection temp table so the deletes below are
+# fixed statements (cached plans, no SQLITE_LIMIT_VARIABLE_NUMBER ceiling).
+PURGE_IDS_TABLE_SQL = "CREATE TEMP TABLE IF NOT EXISTS purge_list_ids (id INTEGER PRIMARY KEY)"
+CLEAR_PURGE_IDS_SQL = "DELETE FROM temp.purge_list_ids"
+STAGE_DISCOVERY_LISTS_SQL = """
+    INSERT INTO temp.purge_list_ids (id)
+    SELECT id FROM lists
+    WHERE name LIKE 'Discovery: %' AND created_at < ?
+"""
+PURGE_DISCOVERY_SQL = (
+    # Delete from processed_ratings first (composite key)
+    "DELETE FROM processed_ratings WHERE list_id IN (SELECT id FROM temp.purge_list_ids)",
+    "DELETE FROM ratings WHERE list_id IN (SELECT id FROM temp.purge_list_ids)",
+    "DELETE FROM lists WHERE id IN (SELECT id FROM temp.purge_list_ids)",
+)
+
+RETRAIN_TIMEOUT_SEC = 60
+
 @asynccontextmanager
 async def lifespan(app=FastAPI):
     """Handle startup/shutdown events."""
     print("Running startup maintenance...")
+    open_shared_db()
     
     # 1. Purge old discovery sessions (6 months)
     discovery_purged = purge_old_discovery_sessions()
     print(f"Purged {discovery_purged} old discovery sessions")
 
+    # 2. Retrain model if new discovery data exists (in the background, so
+    # requests are served while it runs; the new model is swapped in on success)
+    app.state.retrain_task = asyncio.create_task(_retrain_async())
+    
+    yield 
+    # No-op if retraining already finished. Killing retrain.py is safe: it stages its
+    # artifacts and only swaps them in with os.replace once they are complete.
+    app.state.retrain_task.cancel()
+    try:
+        await app.state.retrain_task
+    except asyncio.CancelledError:
+        pass
+    close_shared_db()
+
+async def _retrain_async():
+    """Run retrain.py as a subprocess (60s limit) and reload model artifacts if it succeeds."""
     PROJECT_ROOT = Path(__file__).parent.parent.resolve()
-    # 2. Retrain model if new discovery data exists
+    proc = None
     try:
-        result = subprocess.run(
-            [sys.executable, "data/ML_recs/retrain.py"],
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "data/ML_recs/retrain.py",
             cwd=PROJECT_ROOT,
-            capture_output=True,
-            text=True,
-            timeout=60
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
         )
-        if result.returncode == 0:
-            reload_model_artifacts()
+        # communicate() drains both pipes so a chatty retrain can't block on a full buffer
+        _, stderr = await asyncio.wait_for(proc.communicate(), timeout=RETRAIN_TIMEOUT_SEC)
+        if proc.returncode == 0:
+            await asyncio.to_thread(reload_model_artifacts)
             print("Model retraining completed")
         else:
-            print(f"Retraining failed: {result.stderr}")
+            print(f"Retraining failed: {stderr.decode(errors='replace')}")
+    except asyncio.TimeoutError:
+        print(f"Retraining error: timed out after {RETRAIN_TIMEOUT_SEC} seconds")
+    except asyncio.CancelledError:
+        print("Retraining cancelled at shutdown")
+        raise
     except Exception as e:
         print(f"Retraining error: {e}")
-    
-    yield 
+    finally:
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
 
 def purge_old_discovery_sessions():
     """Permanently delete discovery sessions older than 6 months."""
-    conn = get_db()
-    cursor = conn.cursor()
     cutoff = (datetime.now(timezone.utc) - timedelta(days=180)).isoformat()
-    
-    # Get discovery list IDs
-    cursor.execute("""
-        SELECT id FROM lists 
-        WHERE name LIKE 'Discovery: %' AND created_at < ?
-    """, (cutoff,))
-    list_ids = [row[0] for row in cursor.fetchall()]
-    
-    if not list_ids:
-        conn.close()
-        return 0
-    
-    placeholders = ','.join('?' * len(list_ids))
-    
-    # Delete from processed_ratings first (composite key)
-    cursor.execute(f"""
-        DELETE FROM processed_ratings 
-        WHERE list_id IN ({placeholders})
-    """, list_ids)
-    
-    # Delete ratings
-    cursor.execute(f"""
-        DELETE FROM ratings 
-        WHERE list_id IN ({placeholders})
-    """, list_ids)
-    
-    # Delete lists
-    cursor.execute(f"""
-        DELETE FROM lists 
-        WHERE id IN ({placeholders})
-    """, list_ids)
-    
-    count = len(list_ids)
-    conn.commit()
-    conn.close()
+    with shared_db(write=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute(PURGE_IDS_TABLE_SQL)
+        cursor.execute(CLEAR_PURGE_IDS_SQL)
+
+        # Stage discovery list IDs
+        cursor.execute(STAGE_DISCOVERY_LISTS_SQL, (cutoff,))
+        count = cursor.rowcount
+
+        if count:
+            for sql in PURGE_DISCOVERY_SQL:
+                cursor.execute(sql)
+        cursor.execute(CLEAR_PURGE_IDS_SQL)
+
     return count
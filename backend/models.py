@@ -1,6 +1,7 @@
 # models.py
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, StringConstraints
+from typing import Annotated, Optional
+from uuid import UUID
 
 class RestaurantIngest(BaseModel):
     google_place_id: str
@@ -40,5 +41,7 @@ class RecommendationSession(BaseModel):
     candidates_count: int
 
 class AnswerRequest(BaseModel):
-    session_id: str
-    answer: str
\ No newline at end of file
+    # Malformed session ids / oversized answers are rejected (422) during validation.
+    model_config = ConfigDict(frozen=True)
+    session_id: UUID
+    answer: Annotated[str, StringConstraints(max_length=32)]  # Yes/No, $-tiers, cuisine names
\ No newline at end of file
@@ -1,31 +1,63 @@
 # recommendation_engine.py
 from typing import List, Dict, Any
-from .utils import haversine_distance
+import numpy as np
+from .utils import haversine_distances, bounding_box, TTLCache
+from .database import shared_db
 from typing import Set
 import os
 import json
+import math
+import re
 import threading
+from functools import lru_cache
 import xgboost as xgb
 from data.data_loader import load_restaurants_from_db
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "rating_model.json")
 FEATURE_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "rating_model_features.json")
-xgb_model = xgb.XGBRegressor()
+# Raw Booster rather than the sklearn wrapper: inplace_predict scores a NumPy
+# batch without building a DMatrix per call. Replaced wholesale on reload.
+xgb_model = None
 FEATURE_SCHEMA = []
+# Column positions derived from FEATURE_SCHEMA on every reload.
+PRICE_TIER_IDX = None
+CUISINE_IDX = {}  # cuisine value -> column
+CONTEXT_IDX = {}  # model context label -> column
+ATTR_FEATURES = ()  # schema columns read straight off the restaurant as 0/1 flags
+ATTR_IDX = ()
 MODEL_LOCK = threading.Lock()
+# Model score per feature key (see restaurant_feature_key); replaced with the model
+# on reload so a retrain never serves stale scores.
+PREDICTION_CACHE = {}
+PREDICTION_CACHE_MAX = 10000  # distinct keys are few (price x cuisine x flags x context)
 
 def reload_model_artifacts():
     """
     Reload model + feature schema from disk so inference can pick up retrains
     without a process restart.
     """
-    global FEATURE_SCHEMA
+    global xgb_model, PREDICTION_CACHE, FEATURE_SCHEMA, PRICE_TIER_IDX, CUISINE_IDX, CONTEXT_IDX, ATTR_FEATURES, ATTR_IDX
+    booster = xgb.Booster(model_file=MODEL_PATH)
+    booster.set_param({"nthread": 1})  # batches are a handful of rows; skip OpenMP fan-out
     with MODEL_LOCK:
-        xgb_model.load_model(MODEL_PATH)
+        xgb_model = booster
+        PREDICTION_CACHE = {}
         with open(FEATURE_SCHEMA_PATH, "r", encoding="utf-8") as f:
             FEATURE_SCHEMA = json.load(f)
-
-reload_model_artifacts()
+        PRICE_TIER_IDX = None
+        CUISINE_IDX, CONTEXT_IDX, attrs = {}, {}, []
+        for i, name in enumerate(FEATURE_SCHEMA):
+            if name == "price_tier":
+                PRICE_TIER_IDX = i
+            elif name.startswith("cuisine_"):
+                CUISINE_IDX[name.replace("cuisine_", "", 1)] = i
+            elif name.startswith("context_"):
+                CONTEXT_IDX[name.replace("context_", "", 1)] = i
+            else:
+                attrs.append((name, i))
+        ATTR_FEATURES = tuple(name for name, _ in attrs)
+        ATTR_IDX = tuple(i for _, i in attrs)
+        _build_features_cached.cache_clear()
 
 MODEL_CONTEXTS = [
     "Date Night",
@@ -35,6 +67,16 @@ MODEL_CONTEXTS = [
     "Late Night Eats",
 ]
 
+# Substring tokens per label, checked in priority order (first label that matches wins).
+CONTEXT_TOKEN_PATTERNS = (
+    ("Date Night", re.compile("date|anniversary|romantic")),
+    ("Group Hang", re.compile("group|friends|party|hang")),
+    ("Weekend Brunch", re.compile("brunch|weekend|breakfast")),
+    ("Late Night Eats", re.compile("late|night|bar|after")),
+    ("Quick Lunch", re.compile("lunch|work|quick")),
+)
+
+@lru_cache(maxsize=256)  # a handful of distinct list/session names in practice
 def normalize_context_for_model(raw_context: str) -> str:
     """
     Map free-form session/list contexts to the model's known context labels.
@@ -43,29 +85,74 @@ def normalize_context_for_model(raw_context: str) -> str:
         return raw_context
 
     value = (raw_context or "").strip().lower()
-    if any(token in value for token in ["date", "anniversary", "romantic"]):
-        return "Date Night"
-    if any(token in value for token in ["group", "friends", "party", "hang"]):
-        return "Group Hang"
-    if any(token in value for token in ["brunch", "weekend", "breakfast"]):
-        return "Weekend Brunch"
-    if any(token in value for token in ["late", "night", "bar", "after"]):
-        return "Late Night Eats"
-    if any(token in value for token in ["lunch", "work", "quick"]):
-        return "Quick Lunch"
+    for label, tokens in CONTEXT_TOKEN_PATTERNS:
+        if tokens.search(value):
+            return label
 
     # Safe fallback when context is unknown (e.g., "Discovery Session").
     return "Quick Lunch"
 
+# Nearby requests share cached bbox rows: the key snaps the user to a 3-decimal
+# (~111m) grid and the radius up to a 100m bucket, and the cached box is padded by
+# the worst-case snap offset, so exact distances are still computed per request.
+CANDIDATE_CACHE = TTLCache(maxsize=1024, ttl=60)
+CANDIDATE_GRID_DECIMALS = 3
+CANDIDATE_RADIUS_BUCKET_M = 100
+CANDIDATE_SNAP_SLACK_M = 100  # >= ~79m, the farthest a point sits from its grid cell centre
+
+def _load_candidate_rows(user_lat: float, user_lng: float, max_meters: float):
+    """Return (rows, lats, lngs) for a bbox covering max_meters around the user (cached)."""
+    key = (
+        round(user_lat, CANDIDATE_GRID_DECIMALS),
+        round(user_lng, CANDIDATE_GRID_DECIMALS),
+        math.ceil(max_meters / CANDIDATE_RADIUS_BUCKET_M) * CANDIDATE_RADIUS_BUCKET_M,
+    )
+    cached = CANDIDATE_CACHE.get(key)
+    if cached is not None:
+        return cached
+    bbox = bounding_box(key[0], key[1], key[2] + CANDIDATE_SNAP_SLACK_M)
+    with shared_db() as conn:
+        rows = load_restaurants_from_db(include_location=True, conn=conn, bbox=bbox)
+    lats = np.fromiter((row["latitude"] for row in rows), dtype=np.float64, count=len(rows))
+    lngs = np.fromiter((row["longitude"] for row in rows), dtype=np.float64, count=len(rows))
+    CANDIDATE_CACHE.set(key, (rows, lats, lngs))
+    return rows, lats, lngs
+
 def load_candidate_restaurants(user_lat: float, user_lng: float, max_meters: float) -> List[Dict]:
     """Load operational restaurants within distance (meters) of user."""
-    rows = load_restaurants_from_db(include_location=True)
-    candidates = []
-    for row in rows:
-        dist = haversine_distance(user_lat, user_lng, row["latitude"], row["longitude"])
-        if dist <= max_meters:
-            candidates.append({**dict(row), "distance_m": dist})
-    return candidates
+    # SQL bounding-box prefilter (cached), then exact distances in one vectorized pass.
+    rows, lats, lngs = _load_candidate_rows(user_lat, user_lng, max_meters)
+    if not rows:
+        return []
+    dists = haversine_distances(user_lat, user_lng, lats, lngs)
+    return [
+        {**rows[i], "distance_m": float(dists[i]), "attrs_mask": pack_attrs_mask(rows[i])}
+        for i in np.flatnonzero(dists <= max_meters)
+    ]
+
+# Question attributes packed into one int per candidate ("attrs_mask") so filtering
+# and the discriminative scan compare ints instead of several dict values.
+# Each boolean gets a value bit plus a "known" bit (a NULL matches neither answer,
+# as with the column compare); price_tier (1-3) takes the 2 bits above those.
+BOOL_ATTRS = (
+    "has_outdoor_seating", "good_for_dates", "is_vegan_friendly",
+    "good_for_groups", "quiet_ambiance", "has_cocktails",
+)
+ATTR_BITS = {name: 1 << i for i, name in enumerate(BOOL_ATTRS)}
+KNOWN_SHIFT = len(BOOL_ATTRS)
+PRICE_SHIFT = 2 * len(BOOL_ATTRS)
+ATTR_MASKS = {name: bit | (bit << KNOWN_SHIFT) for name, bit in ATTR_BITS.items()}
+ATTR_MASKS["price_tier"] = 0b11 << PRICE_SHIFT
+
+def pack_attrs_mask(restaurant: Dict) -> int:
+    mask = (int(restaurant["price_tier"]) & 0b11) << PRICE_SHIFT
+    for name, bit in ATTR_BITS.items():
+        value = restaurant[name]
+        if value is not None:
+            mask |= bit << KNOWN_SHIFT
+            if value:
+                mask |= bit
+    return mask
     
 def build_question(attr: str, values: Set[Any]) -> tuple:
     """Return (question_id, question_text, options)"""
@@ -84,26 +171,47 @@ def build_question(attr: str, values: Set[Any]) -> tuple:
         return mapping[attr]
     return ("fallback", "Any other preference?", ["Yes", "No"])
 
+# Priority order: most discriminative questions first
+QUESTION_ORDER = [
+    "price_tier", "cuisine", "has_outdoor_seating", "good_for_dates",
+    "is_vegan_friendly", "good_for_groups", "quiet_ambiance", "has_cocktails"
+]
+
+def discriminative_attrs(candidates: List[Dict], attrs: List[str]) -> Set[str]:
+    """
+    Return the attrs that take more than one value across candidates.
+    Single pass over candidates; an attr stops being checked once it differs.
+    """
+    if not candidates:
+        return set()
+    first = candidates[0]
+    first_mask = first["attrs_mask"]
+    unpacked = [attr for attr in attrs if attr not in ATTR_MASKS]
+    remaining = list(attrs)
+    found = set()
+    for c in candidates:
+        diff = c["attrs_mask"] ^ first_mask
+        if not diff and all(c[attr] == first[attr] for attr in unpacked):
+            continue
+        differing = [
+            attr for attr in remaining
+            if (diff & ATTR_MASKS[attr] if attr in ATTR_MASKS else c[attr] != first[attr])
+        ]
+        if differing:
+            found.update(differing)
+            remaining = [attr for attr in remaining if attr not in found]
+            if not remaining:
+                break
+    return found
+
 def select_best_question(candidates: List[Dict]) -> tuple:
     if len(candidates) <= 1:
         return ("complete", "We found your match!", [])
     
-    # Priority order: most discriminative questions first
-    question_order = [
-        ("price_tier", lambda c: c["price_tier"]),
-        ("cuisine", lambda c: c["cuisine"]),
-        ("has_outdoor_seating", lambda c: c["has_outdoor_seating"]),
-        ("good_for_dates", lambda c: c["good_for_dates"]),
-        ("is_vegan_friendly", lambda c: c["is_vegan_friendly"]),
-        ("good_for_groups", lambda c: c["good_for_groups"]),
-        ("quiet_ambiance", lambda c: c["quiet_ambiance"]),
-        ("has_cocktails", lambda c: c["has_cocktails"]),
-    ]
-    
-    for attr, extractor in question_order:
-        unique_vals = {extractor(c) for c in candidates}
-        if len(unique_vals) > 1:
-            return build_question(attr, unique_vals)
+    discriminative = discriminative_attrs(candidates, QUESTION_ORDER)
+    for attr in QUESTION_ORDER:
+        if attr in discriminative:
+            return build_question(attr, {c[attr] for c in candidates})
     
     # All attributes identical
     return ("complete", "All remaining options are similar!", [])
@@ -113,21 +221,17 @@ def filter_candidates(candidates: List[Dict], question_id: str, answer: str) ->
     if question_id == "price_tier":
         tier_map = {"$": 1, "$$": 2, "$$$": 3}
         target_tier = tier_map.get(answer, 2)
-        return [c for c in candidates if c["price_tier"] == target_tier]
+        mask, want = ATTR_MASKS["price_tier"], target_tier << PRICE_SHIFT
+        return [c for c in candidates if (c["attrs_mask"] & mask) == want]
     
     # Boolean questions
-    bool_questions = {
-        "has_outdoor_seating",
-        "good_for_dates",
-        "is_vegan_friendly",
-        "good_for_groups",
-        "quiet_ambiance",
-        "has_cocktails"
-    }
-    
-    if question_id in bool_questions:
-        target = (answer.lower() == "yes")
-        return [c for c in candidates if c[question_id] == target]
+    if question_id in ATTR_BITS:
+        bit = ATTR_BITS[question_id]
+        want = bit << KNOWN_SHIFT
+        if answer.lower() == "yes":
+            want |= bit
+        mask = ATTR_MASKS[question_id]
+        return [c for c in candidates if (c["attrs_mask"] & mask) == want]
     
     # Cuisine
     if question_id == "cuisine":
@@ -137,26 +241,41 @@ def filter_candidates(candidates: List[Dict], question_id: str, answer: str) ->
 
 # 1/11/26 ML-guided recommendations WIP 
 
-def build_restaurant_features(restaurant: dict, context: str) -> list:
+def build_restaurant_features(restaurant: dict, context: str) -> np.ndarray:
     """
     Build feature vector using the saved training schema.
     This avoids manual column-order drift between training and inference.
+    Vectors are memoized per (feature values, context); treat them as read-only.
     """
-    feature_values = {name: 0.0 for name in FEATURE_SCHEMA}
-    normalized_context = normalize_context_for_model(context)
+    return _build_features_cached(*restaurant_feature_key(restaurant, context))
 
-    if "price_tier" in feature_values:
-        feature_values["price_tier"] = float(restaurant.get("price_tier", 0) or 0)
+def restaurant_feature_key(restaurant: dict, context: str) -> tuple:
+    """Hashable (price_tier, cuisine, attr flags, model context) that fully determines the vector."""
+    return (
+        float(restaurant.get("price_tier", 0) or 0),
+        restaurant.get("cuisine"),
+        tuple(bool(restaurant.get(name)) for name in ATTR_FEATURES),
+        normalize_context_for_model(context),
+    )
 
-    for name in FEATURE_SCHEMA:
-        if name.startswith("cuisine_"):
-            feature_values[name] = 1.0 if restaurant.get("cuisine") == name.replace("cuisine_", "", 1) else 0.0
-        elif name.startswith("context_"):
-            feature_values[name] = 1.0 if normalized_context == name.replace("context_", "", 1) else 0.0
-        elif name in restaurant:
-            feature_values[name] = 1.0 if bool(restaurant.get(name)) else 0.0
+@lru_cache(maxsize=10000)
+def _build_features_cached(price_tier: float, cuisine, attr_flags: tuple, context: str) -> np.ndarray:
+    vec = np.zeros(len(FEATURE_SCHEMA), dtype=np.float32)
+    if PRICE_TIER_IDX is not None:
+        vec[PRICE_TIER_IDX] = price_tier
+    i = CUISINE_IDX.get(cuisine)
+    if i is not None:
+        vec[i] = 1.0
+    i = CONTEXT_IDX.get(normalize_context_for_model(context))
+    if i is not None:
+        vec[i] = 1.0
+    for i, flag in zip(ATTR_IDX, attr_flags):
+        if flag:
+            vec[i] = 1.0
+    vec.setflags(write=False)
+    return vec
 
-    return [feature_values[name] for name in FEATURE_SCHEMA]
+BALANCED_SPLIT_RATIO = 0.7  # largest answer branch, as a share of candidates, that skips the model
 
 def select_best_question_ml(candidates: List[Dict], session) -> tuple:
     """
@@ -165,44 +284,49 @@ def select_best_question_ml(candidates: List[Dict], session) -> tuple:
     if len(candidates) <= 1:
         return ("complete", "We found your match!", [])
     
-    question_order = [
-    "price_tier", "cuisine", "has_outdoor_seating", "good_for_dates",
-    "is_vegan_friendly", "good_for_groups", "quiet_ambiance", "has_cocktails"
-    ]
     asked_attrs = set(session["questions_asked"]) 
+    open_attrs = [attr for attr in QUESTION_ORDER if attr not in asked_attrs]
+    discriminative = discriminative_attrs(candidates, open_attrs)
+    
+    # One pass per attribute: first (top) candidate and count per value present.
+    groups = []  # (attr, firsts, max_branch)
+    for attr in open_attrs:
+        if attr not in discriminative:
+            continue
+        firsts, counts = {}, {}
+        for c in candidates:
+            val = c[attr]
+            firsts.setdefault(val, c)
+            counts[val] = counts.get(val, 0) + 1
+        groups.append((attr, firsts, max(counts.values())))
+    
+    # Easy case: an answer to some attribute leaves < BALANCED_SPLIT_RATIO of the
+    # candidates whatever it is; ask the most balanced one without the model.
+    if groups:
+        attr, firsts, max_branch = min(groups, key=lambda g: g[2])
+        if max_branch < BALANCED_SPLIT_RATIO * len(candidates):
+            return build_question(attr, set(firsts))
+    
+    # Collect one feature key per (attr, value) split, then score them together.
+    feature_keys = []
+    splits = []  # (attr, unique_vals, start, stop) slices into feature_keys
+    for attr, firsts, _ in groups:
+        unique_vals = set(firsts)
+        start = len(feature_keys)
+        for val in unique_vals:
+            feature_keys.append(_candidate_feature_key(firsts[val], session["context"]))
+        splits.append((attr, unique_vals, start, len(feature_keys)))
+    
+    if not splits:
+        return ("complete", "All options are similar!", [])
+    
+    preds = _predict_scores(feature_keys)
     
     best_attr = None
     best_values = set()
     best_expected_rating = -1
-    
-    for attr in question_order:
-        if attr in asked_attrs:
-            continue
-            
-        # Get values that exist in current candidates
-        unique_vals = {c[attr] for c in candidates}
-        if len(unique_vals) <= 1:
-            continue
-        
-        total_rating = 0
-        valid_answers = 0  # ← track how many answers lead to non-empty sets
-        
-        for val in unique_vals:
-            filtered = [c for c in candidates if c[attr] == val]
-            if not filtered:  # skip empty splits
-                continue
-                
-            valid_answers += 1
-            top_candidate = filtered[0]
-            feat_vec = build_restaurant_features(top_candidate, session["context"])
-            with MODEL_LOCK:
-                pred = xgb_model.predict([feat_vec])[0]
-            total_rating += pred
-        
-        if valid_answers == 0:  # no valid answers
-            continue
-            
-        avg_rating = total_rating / valid_answers
+    for attr, unique_vals, start, stop in splits:
+        avg_rating = float(preds[start:stop].mean())
         if avg_rating > best_expected_rating:
             best_expected_rating = avg_rating
             best_attr = attr
@@ -213,3 +337,34 @@ def select_best_question_ml(candidates: List[Dict], session) -> tuple:
     
     # Add to session after selection
     return build_question(best_attr, best_values)
+
+def _candidate_feature_key(candidate: Dict, context: str) -> tuple:
+    """
+    restaurant_feature_key memoized on the candidate dict, which lives for one session,
+    so later questions skip the flag/context normalization. Rebuilt if the context
+    changes or a reload replaced the schema (ATTR_FEATURES).
+    """
+    cached = candidate.get("_feature_key")
+    if cached is None or cached[0] != context or cached[1] is not ATTR_FEATURES:
+        cached = (context, ATTR_FEATURES, restaurant_feature_key(candidate, context))
+        candidate["_feature_key"] = cached
+    return cached[2]
+
+def _predict_scores(feature_keys: List[tuple]) -> np.ndarray:
+    """Model scores for feature keys; only keys missing from PREDICTION_CACHE hit the model."""
+    with MODEL_LOCK:
+        model, scores = xgb_model, PREDICTION_CACHE
+    # Reload swaps in a new Booster/cache pair rather than mutating these, so scoring
+    # runs outside the lock; scores for a superseded model land in its discarded cache.
+    found = {key: scores.get(key) for key in dict.fromkeys(feature_keys)}
+    missing = [key for key, score in found.items() if score is None]
+    if missing:
+        preds = model.inplace_predict(np.stack([_build_features_cached(*key) for key in missing]))
+        found.update(zip(missing, preds))
+        if len(scores) + len(missing) > PREDICTION_CACHE_MAX:
+            scores.clear()
+        scores.update(zip(missing, preds))
+    return np.array([found[key] for key in feature_keys], dtype=np.float32)
+
+# Load artifacts at import (after the feature cache it resets is defined).
+reload_model_artifacts()
@@ -1,30 +1,54 @@
 # routes/ratings.py
 from fastapi import APIRouter, HTTPException
+from typing import List
 import sqlite3
-from ..database import get_db
+from ..database import shared_db
 from ..models import RatingCreate
 
 router = APIRouter(tags=["ratings"])
 
+# Same list/restaurant guards as /rate; OR IGNORE turns duplicates into skips
+# instead of per-row IntegrityErrors.
+RATE_BATCH_SQL = """
+    INSERT OR IGNORE INTO ratings (user_id, restaurant_id, list_id, rating)
+    SELECT 1, ?, ?, ?
+    WHERE EXISTS (SELECT 1 FROM lists WHERE id = ? AND user_id = 1)
+      AND EXISTS (SELECT 1 FROM restaurants WHERE id = ?)
+"""
+
 @router.post("/rate", status_code=201)
 def rate_restaurant(data: RatingCreate):
     if not (1 <= data.rating <= 5):
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM lists WHERE id = ? AND user_id = 1", (data.list_id,))
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="List not found")
-    cursor.execute("SELECT id FROM restaurants WHERE id = ?", (data.restaurant_id,))
-    if not cursor.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    try:
-        cursor.execute("INSERT INTO ratings (user_id, restaurant_id, list_id, rating) VALUES (?, ?, ?, ?)", (1, data.restaurant_id, data.list_id, data.rating))
-    except sqlite3.IntegrityError:
-        conn.close()
-        raise HTTPException(status_code=409, detail="Rating already exists for this restaurant in this list")
-    conn.commit()
-    conn.close()
-    return {"message": "Rating submitted"}
\ No newline at end of file
+    with shared_db(write=True) as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO ratings (user_id, restaurant_id, list_id, rating)
+                SELECT ?, ?, ?, ?
+                WHERE EXISTS (SELECT 1 FROM lists WHERE id = ? AND user_id = 1)
+                  AND EXISTS (SELECT 1 FROM restaurants WHERE id = ?)
+            """, (1, data.restaurant_id, data.list_id, data.rating, data.list_id, data.restaurant_id))
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=409, detail="Rating already exists for this restaurant in this list")
+        if cursor.rowcount == 0:
+            # A guard failed; one lookup tells us which.
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM lists WHERE id = ? AND user_id = 1)", (data.list_id,))
+            if not cursor.fetchone()[0]:
+                raise HTTPException(status_code=404, detail="List not found")
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+    return {"message": "Rating submitted"}
+
+@router.post("/rate/batch", status_code=201)
+def rate_restaurants_batch(ratings: List[RatingCreate]):
+    """
+    Insert many ratings in one transaction. Rows whose list or restaurant doesn't
+    exist, or that are already rated, are skipped rather than failing the batch.
+    """
+    invalid = [i for i, r in enumerate(ratings) if not (1 <= r.rating <= 5)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Rating must be between 1 and 5 (items {invalid})")
+    rows = [(r.restaurant_id, r.list_id, r.rating, r.list_id, r.restaurant_id) for r in ratings]
+    with shared_db(write=True) as conn:
+        inserted = conn.executemany(RATE_BATCH_SQL, rows).rowcount if rows else 0
+    return {"inserted": inserted, "skipped": len(rows) - inserted}
@@ -1,13 +1,16 @@
 # routes/recommender.py
 from fastapi import APIRouter, HTTPException
+import threading
 import uuid
 from ..recommendation_engine import load_candidate_restaurants, select_best_question, filter_candidates, select_best_question_ml
-from ..utils import is_in_mission_sf
+from ..utils import is_in_mission_sf, TTLCache
 from ..models import RecommendationRequest, AnswerRequest 
 
 router = APIRouter(prefix="/recommend", tags=["recommendations"])
 
-SESSIONS = {} # In-memory sessions: {session_id: {"candidates": [...], "questions_asked": int, "max_questions": int}}
+# In-memory sessions: {session_id: {"candidates": [...], "questions_asked": [...], "max_questions": int, ...}}
+# Thread-safe and bounded; abandoned sessions expire 30 minutes after their last answer.
+SESSIONS = TTLCache(maxsize=10000, ttl=1800)
 
 @router.post("/start")
 def start_session(request: RecommendationRequest): 
@@ -23,18 +26,21 @@ def start_session(request: RecommendationRequest):
         raise HTTPException(status_code=404, detail="No restaurants in range")
     
     session_id = str(uuid.uuid4())
-    SESSIONS[session_id] = {
+    session = {
         "candidates": candidates,
         "questions_asked": [],
         "max_questions": request.max_questions,
         "list_id": request.list_id,
-        "context": "Discovery Session" 
+        "context": "Discovery Session",
+        "lock": threading.Lock(),  # serializes concurrent answers to this session
     }
     
     # Hardcoded to use ML-based question selection for now
     # question_id, question_text, options = select_best_question(candidates)
-    SESSIONS[session_id]["context"] = "Discovery Session"  # store context in session
-    question_id, question_text, options = select_best_question_ml(candidates, SESSIONS[session_id])
+    session["context"] = "Discovery Session"  # store context in session
+    question_id, question_text, options = select_best_question_ml(candidates, session)
+    session["current_question_id"] = question_id  # the question this session's next answer is for
+    SESSIONS.set(session_id, session)
     
     return {
         "session_id": session_id,
@@ -44,19 +50,24 @@ def start_session(request: RecommendationRequest):
 
 @router.post("/answer")
 def answer_question(request: AnswerRequest):
-    session_id = request.session_id
+    session_id = str(request.session_id)  # canonical form, as issued by /start
     answer = request.answer
-    if session_id not in SESSIONS:
+    session = SESSIONS.get(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    session = SESSIONS[session_id]
+    with session["lock"]:
+        # A concurrent answer may have finished (and removed) the session meanwhile.
+        if SESSIONS.get(session_id) is not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return _answer_locked(session_id, session, answer)
+
+def _answer_locked(session_id: str, session: dict, answer: str):
     candidates = session["candidates"]
     questions_asked = session["questions_asked"]
     max_questions = session["max_questions"]
     
-    # Get current question to interpret answer currently hardcoded to use ML-based question selection
-    # question_id, _, _ = select_best_question(candidates)
-    question_id, question_text, options = select_best_question_ml(candidates, session)
+    # Interpret the answer against the question we actually asked (stored when it was chosen)
+    question_id = session["current_question_id"]
     
     # Filter candidates based on answer
     new_candidates = filter_candidates(candidates, question_id, answer)
@@ -78,12 +89,14 @@ def answer_question(request: AnswerRequest):
             for c in new_candidates[:3]
         ]
         # Clean up session
-        del SESSIONS[session_id]
+        SESSIONS.pop(session_id)
         return {"recommendations": results}
     
     # Ask next question defaulted to use ML-based question selection
     # next_q_id, next_q_text, next_options = select_best_question(new_candidates)
     next_q_id, next_q_text, next_options = select_best_question_ml(new_candidates, session)
+    session["current_question_id"] = next_q_id
+    SESSIONS.set(session_id, session)  # refresh the session's TTL
     return {
         "session_id": session_id,
         "question": {"id": next_q_id, "text": next_q_text, "options": next_options},
@@ -1,40 +1,75 @@
 # routes/restaurants.py
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from typing import List
-from ..database import get_db
+import re
+import sqlite3
+from ..database import shared_db, last_restaurant_id, index_new_restaurants
 from ..models import RestaurantIngest
+from ..recommendation_engine import CANDIDATE_CACHE
+from ..utils import TTLCache
 
 router = APIRouter(prefix="/restaurants", tags=["restaurants"])
 
+INGEST_SQL = """
+    INSERT OR IGNORE INTO restaurants (
+        google_place_id, name, latitude, longitude, address, price_level, business_status
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+SEARCH_SQL = """
+    SELECT rowid AS id, name FROM restaurants_fts
+    WHERE restaurants_fts MATCH ?
+    ORDER BY rank
+    LIMIT 10
+"""
+BROWSE_SQL = "SELECT id, name FROM restaurants ORDER BY name LIMIT 10"
+SEARCH_TOKEN_RE = re.compile(r"\w+")
+# Autocomplete repeats the same prefixes; keyed by the normalized MATCH string.
+# Cleared (with the candidate cache) whenever an ingest adds restaurants.
+SEARCH_CACHE = TTLCache(maxsize=1024, ttl=60)
+
+def _build_search_match(q: str) -> str:
+    """Turn free text into an FTS5 prefix query, dropping FTS syntax characters."""
+    tokens = SEARCH_TOKEN_RE.findall(q)
+    return " ".join(f'"{token}"*' for token in tokens)
+
 @router.post("/ingest", status_code=201)
 def ingest_restaurants(restaurants: List[RestaurantIngest]):
-    conn = get_db()
-    cursor = conn.cursor()
-    inserted = 0
-    for r in restaurants:
-        try:
-            cursor.execute("""
-                INSERT OR IGNORE INTO restaurants (
-                    google_place_id, name, latitude, longitude, address, price_level, business_status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                r.google_place_id, r.name, r.latitude, r.longitude,
-                r.address, r.price_level, r.business_status
-            ))
-            if cursor.rowcount > 0:
-                inserted += 1
-        except Exception as e:
-            conn.close()
-            raise HTTPException(status_code=400, detail=f"Insert failed: {str(e)}")
-    conn.commit()
-    conn.close()
+    rows = [
+        (r.google_place_id, r.name, r.latitude, r.longitude, r.address, r.price_level, r.business_status)
+        for r in restaurants
+    ]
+    inserted = _insert_restaurants(rows)
+    if inserted:
+        SEARCH_CACHE.clear()
+        CANDIDATE_CACHE.clear()
     return {"inserted": inserted}
 
+def _insert_restaurants(rows) -> int:
+    try:
+        # One transaction for the whole batch; rolls back atomically on failure.
+        with shared_db(write=True) as conn:
+            last_id = last_restaurant_id(conn)
+            cursor = conn.executemany(INGEST_SQL, rows)
+            inserted = cursor.rowcount
+            if inserted:
+                index_new_restaurants(conn, last_id)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=400, detail=f"Insert failed: {str(e)}")
+    return inserted
+
 @router.get("/search")
 def search_restaurants(q: str):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name FROM restaurants WHERE name LIKE ? ORDER BY name LIMIT 10", (f"%{q}%",))
-    results = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return results
\ No newline at end of file
+    match = _build_search_match(q)
+    results = SEARCH_CACHE.get(match)
+    if results is None:
+        with shared_db() as conn:
+            cursor = conn.cursor()
+            if match:
+                cursor.execute(SEARCH_SQL, (match,))
+            else:
+                cursor.execute(BROWSE_SQL)
+            results = [{"id": row[0], "name": row[1]} for row in cursor.fetchall()]
+        SEARCH_CACHE.set(match, results)
+    # Rows are already JSON-native; skip FastAPI's jsonable_encoder walk.
+    return JSONResponse(results)
\ No newline at end of file
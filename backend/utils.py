@@ -1,4 +1,11 @@
 import math
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+METERS_PER_DEGREE_LAT = EARTH_RADIUS_M * math.pi / 180  # consistent with the haversine radius
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Return distance in meters."""
@@ -7,7 +14,24 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     dlon = lon2 - lon1
     a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
     c = 2 * math.asin(math.sqrt(a))
-    return c * 6371000  # meters
+    return c * EARTH_RADIUS_M  # meters
+
+def haversine_distances(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorized haversine_distance from one point to arrays of points, in meters."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def bounding_box(lat: float, lng: float, meters: float) -> tuple:
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing every point within `meters`.
+    Longitude span uses the poleward edge so the box never under-covers the circle.
+    """
+    dlat = meters / METERS_PER_DEGREE_LAT
+    edge_lat = min(89.0, abs(lat) + dlat)
+    dlng = meters / (METERS_PER_DEGREE_LAT * math.cos(math.radians(edge_lat)))
+    return (lat - dlat, lat + dlat, lng - dlng, lng + dlng)
 
 MISSION_SF_BBOX = {
   "min_lat": 37.74802895624222,
@@ -15,8 +39,52 @@ MISSION_SF_BBOX = {
   "min_lng": -122.42248265700066,
   "max_lng": -122.40801467343661
 }
+# Unpacked once so the check is plain float compares, no dict lookups per call.
+_MISSION_MIN_LAT, _MISSION_MAX_LAT = MISSION_SF_BBOX["min_lat"], MISSION_SF_BBOX["max_lat"]
+_MISSION_MIN_LNG, _MISSION_MAX_LNG = MISSION_SF_BBOX["min_lng"], MISSION_SF_BBOX["max_lng"]
+
 def is_in_mission_sf(lat: float, lng: float) -> bool:
     return (
-        MISSION_SF_BBOX["min_lat"] <= lat <= MISSION_SF_BBOX["max_lat"] and
-        MISSION_SF_BBOX["min_lng"] <= lng <= MISSION_SF_BBOX["max_lng"]
-    )
\ No newline at end of file
+        _MISSION_MIN_LAT <= lat <= _MISSION_MAX_LAT and
+        _MISSION_MIN_LNG <= lng <= _MISSION_MAX_LNG
+    )
+
+class TTLCache:
+    """
+    Thread-safe LRU mapping whose entries expire `ttl` seconds after they are set.
+    Minimal stdlib stand-in for cachetools.TTLCache: get / set / pop / clear only.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
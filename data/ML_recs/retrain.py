@@ -1,7 +1,10 @@
 # retrain.py
 import os
+import re
 import sys
 import json
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
 import numpy as np
 import pandas as pd
 import xgboost as xgb
@@ -19,11 +22,20 @@ from train_model import (
     evaluate_grouped_ranking_metrics,
     RANK_K_VALUES,
     RELEVANCE_THRESHOLD,
+    RATINGS_CSV_DTYPES,
 )
 
 MODEL_PATH = os.path.join(PROJECT_ROOT, "rating_model.json")
 FEATURE_SCHEMA_PATH = os.path.join(PROJECT_ROOT, "rating_model_features.json")
 MIN_NEW_SESSIONS = 1
+# Small batches of new ratings extend the current booster instead of refitting from
+# scratch; a full rebuild still runs monthly (tracked in the model file itself), on
+# large batches, and whenever new data adds feature columns.
+INCREMENTAL_TREES = 20
+INCREMENTAL_LEARNING_RATE = 0.05
+INCREMENTAL_MAX_NEW_RATINGS = 1000
+FULL_REBUILD_DAYS = 30
+FULL_TRAINED_AT_ATTR = "full_trained_at"
 MODEL_CONTEXTS = [
     "Date Night",
     "Group Hang",
@@ -32,35 +44,110 @@ MODEL_CONTEXTS = [
     "Late Night Eats",
 ]
 
+# Substring tokens per label, checked in priority order (first label that matches wins).
+CONTEXT_TOKEN_PATTERNS = (
+    ("Date Night", re.compile("date|anniversary|romantic")),
+    ("Group Hang", re.compile("group|friends|party|hang")),
+    ("Weekend Brunch", re.compile("brunch|weekend|breakfast")),
+    ("Late Night Eats", re.compile("late|night|bar|after")),
+    ("Quick Lunch", re.compile("lunch|work|quick")),
+)
+
+@lru_cache(maxsize=256)
 def normalize_context_for_model(raw_context: str) -> str:
     if raw_context in MODEL_CONTEXTS:
         return raw_context
 
     value = (raw_context or "").strip().lower()
-    if any(token in value for token in ["date", "anniversary", "romantic"]):
-        return "Date Night"
-    if any(token in value for token in ["group", "friends", "party", "hang"]):
-        return "Group Hang"
-    if any(token in value for token in ["brunch", "weekend", "breakfast"]):
-        return "Weekend Brunch"
-    if any(token in value for token in ["late", "night", "bar", "after"]):
-        return "Late Night Eats"
-    if any(token in value for token in ["lunch", "work", "quick"]):
-        return "Quick Lunch"
+    for label, tokens in CONTEXT_TOKEN_PATTERNS:
+        if tokens.search(value):
+            return label
     return "Quick Lunch"
 
+def _staging_path(path):
+    # Keep the extension: save_model picks the serialization format from it.
+    root, ext = os.path.splitext(path)
+    return f"{root}.tmp{ext}"
+
+def _stage_artifacts(model, feature_names=None):
+    """
+    Write the model (and schema, if given) to temp files next to the live ones.
+    Returns (temp, final) pairs for _publish_artifacts; the live files are untouched,
+    so a run killed here leaves the previous model/schema pair intact.
+    """
+    staged = []
+    model_tmp = _staging_path(MODEL_PATH)
+    model.save_model(model_tmp)
+    staged.append((model_tmp, MODEL_PATH))
+    if feature_names is not None:
+        schema_tmp = _staging_path(FEATURE_SCHEMA_PATH)
+        with open(schema_tmp, "w", encoding="utf-8") as f:
+            json.dump(feature_names, f)
+        staged.append((schema_tmp, FEATURE_SCHEMA_PATH))
+    return staged
+
+def _publish_artifacts(staged):
+    # os.replace is atomic per file: readers see the old or the new file, never a partial one
+    for tmp_path, final_path in staged:
+        os.replace(tmp_path, final_path)
+
+def _mark_processed(conn, new_ratings):
+    # Mark new ratings as processed (one statement, one transaction)
+    conn.executemany("""
+        INSERT INTO processed_ratings (user_id, restaurant_id, list_id)
+        VALUES (?, ?, ?)
+    """, [(row[0], row[1], row[2]) for row in new_ratings])
+    conn.commit()
+
+def _incremental_update(new_df, restaurants):
+    """
+    Fit INCREMENTAL_TREES extra trees on just the new ratings, continuing the saved
+    booster. Returns the staged artifacts, or None (caller does a full retrain) when
+    that isn't appropriate.
+    """
+    if len(new_df) > INCREMENTAL_MAX_NEW_RATINGS:
+        return None
+    if not (os.path.exists(MODEL_PATH) and os.path.exists(FEATURE_SCHEMA_PATH)):
+        return None
+    booster = xgb.Booster(model_file=MODEL_PATH)
+    full_trained_at = booster.attr(FULL_TRAINED_AT_ATTR)
+    if full_trained_at is None:
+        return None
+    if datetime.now(timezone.utc) - datetime.fromisoformat(full_trained_at) > timedelta(days=FULL_REBUILD_DAYS):
+        return None
+    with open(FEATURE_SCHEMA_PATH, "r", encoding="utf-8") as f:
+        feature_names = json.load(f)
+
+    X_new = engineer_features(new_df, restaurants).fillna(0)
+    if not set(X_new.columns) <= set(feature_names):
+        return None  # unseen cuisine/context: the schema has to grow
+    X_new = X_new.reindex(columns=feature_names, fill_value=0)
+
+    model = xgb.XGBRegressor(
+        n_estimators=INCREMENTAL_TREES,
+        max_depth=6,
+        learning_rate=INCREMENTAL_LEARNING_RATE,
+        random_state=42,
+        objective="reg:squarederror",
+        tree_method="hist",
+    )
+    model.fit(X_new, new_df["rating"].astype(np.float32), xgb_model=booster)
+    return _stage_artifacts(model)  # schema is unchanged
+
 def retrain_model():
     conn = get_db()
     cursor = conn.cursor()
     
-    # Find NEW ratings (not in processed_ratings)
+    # Find NEW ratings (not in processed_ratings); anti-join probes its PK per rating
     cursor.execute("""
         SELECT r.user_id, r.restaurant_id, r.list_id, r.rating, l.name as context
         FROM ratings r
         JOIN lists l ON r.list_id = l.id
-        WHERE (r.user_id, r.restaurant_id, r.list_id) NOT IN (
-            SELECT user_id, restaurant_id, list_id FROM processed_ratings
-        )
+        LEFT JOIN processed_ratings p
+            ON p.user_id = r.user_id
+            AND p.restaurant_id = r.restaurant_id
+            AND p.list_id = r.list_id
+        WHERE p.user_id IS NULL
     """)
     new_ratings = cursor.fetchall()
     
@@ -75,20 +162,30 @@ def retrain_model():
         columns=["user_id", "restaurant_id", "list_id", "rating", "context"]
     )
     
-    # Combine with synthetic data
-    synthetic_df = pd.read_csv("data/synthetic_ratings1.csv")
     new_df["context"] = new_df["context"].map(normalize_context_for_model)
-    full_df = pd.concat([synthetic_df, new_df[["user_id", "restaurant_id", "rating", "context"]]], ignore_index=True)
+    new_df = new_df[["user_id", "restaurant_id", "rating", "context"]]
     
-    # 3. Engineer features
     restaurants = load_restaurants_from_db()
+    staged = _incremental_update(new_df, restaurants)
+    if staged:
+        _publish_artifacts(staged)
+        _mark_processed(conn, new_ratings)
+        conn.close()
+        print(f"Model updated incrementally using {len(new_df)} new ratings.")
+        return True
+
+    # Combine with synthetic data (only the full rebuild needs it)
+    synthetic_df = pd.read_csv("data/synthetic_ratings1.csv", dtype=RATINGS_CSV_DTYPES)
+    full_df = pd.concat([synthetic_df, new_df], ignore_index=True)
+
+    # 3. Engineer features
     X = engineer_features(full_df, restaurants)
-    y = full_df["rating"]
+    y = full_df["rating"].astype(np.float32)  # XGBoost keeps labels as float32
     X = X.fillna(0)
     feature_names = X.columns.tolist()
 
     # 4. Evaluation on grouped held-out split (same style as train_model).
-    groups = pd.util.hash_pandas_object(X, index=False).astype(str)
+    groups = pd.util.hash_pandas_object(X, index=False).to_numpy()
     splitter = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
     train_idx, test_idx = next(splitter.split(X, y, groups=groups))
     X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
@@ -100,6 +197,7 @@ def retrain_model():
         learning_rate=0.1,
         random_state=42,
         objective="reg:squarederror",
+        tree_method="hist",
     )
     eval_model.fit(X_train, y_train)
 
@@ -139,21 +237,15 @@ def retrain_model():
         learning_rate=0.1,
         random_state=42,
         objective="reg:squarederror",
+        tree_method="hist",
     )
     model.fit(X, y)
-    model.save_model(MODEL_PATH)
-    with open(FEATURE_SCHEMA_PATH, "w", encoding="utf-8") as f:
-        json.dump(feature_names, f)
-    
-    # Mark new ratings as processed
-    for row in new_ratings:
-        user_id, restaurant_id, list_id = row[0], row[1], row[2]
-        cursor.execute("""
-            INSERT INTO processed_ratings (user_id, restaurant_id, list_id)
-            VALUES (?, ?, ?)
-        """, (user_id, restaurant_id, list_id))
-    
-    conn.commit()
+    model.get_booster().set_attr(**{FULL_TRAINED_AT_ATTR: datetime.now(timezone.utc).isoformat()})
+    staged = _stage_artifacts(model, feature_names)
+
+    # Publish before marking: a run killed in between just retrains these ratings next time
+    _publish_artifacts(staged)
+    _mark_processed(conn, new_ratings)
     conn.close()
 
     print(f"Model retrained using {len(new_df)} new ratings.")
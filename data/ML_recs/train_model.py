@@ -13,90 +13,94 @@ MODEL_PATH = "./rating_model.json"
 FEATURE_SCHEMA_PATH = "./rating_model_features.json"
 RANK_K_VALUES = (3, 5)
 RELEVANCE_THRESHOLD = 4
+# Explicit dtypes so read_csv skips per-column type inference.
+RATINGS_CSV_DTYPES = {"user_id": str, "context": str, "restaurant_id": "int64", "rating": "int64"}
+
+
+NON_FEATURE_COLUMNS = ("user_id", "restaurant_id", "name", "rating")
+ONE_HOT_COLUMNS = ("cuisine", "context")
 
 
 def engineer_features(df, restaurant_list):
     """
     df: synthetic ratings DataFrame [user_id, context, restaurant_id, rating]
     restaurant_list: list of dicts from load_restaurants_from_db()
+    Returns float32 restaurant columns followed by uint8 one-hot blocks, with the
+    same column names/order pd.get_dummies produced (sorted values present in df).
     """
-    restaurants_df = pd.DataFrame(restaurant_list)
-
-    # Merge restaurant attributes
-    df = df.merge(restaurants_df, left_on="restaurant_id", right_on="id", how="left")
-
-    # One-hot encode CUISINE and CONTEXT
-    df = pd.get_dummies(df, columns=["cuisine", "context"], prefix=["cuisine", "context"])
-
-    # Drop all non-feature columns (including 'name', 'id')
-    cols_to_drop = ["user_id", "restaurant_id", "id", "name", "rating"]
-    for col in cols_to_drop:
-        if col in df.columns:
-            df = df.drop(columns=[col])
+    restaurants_df = pd.DataFrame(restaurant_list).set_index("id")
 
-    # Ensure all remaining columns are numeric
-    df = df.astype(float)
-    return df
+    # Join restaurant attributes on the id index (no duplicate key column to drop)
+    df = df.join(restaurants_df, on="restaurant_id")
 
+    # Drop all non-feature columns (including 'name'); the rest must be numeric
+    drop = [col for col in NON_FEATURE_COLUMNS + ONE_HOT_COLUMNS if col in df.columns]
+    blocks = [df.drop(columns=drop).astype(np.float32)]
 
-def _dcg(relevances):
-    vals = np.asarray(relevances, dtype=float)
-    if vals.size == 0:
-        return 0.0
-    discounts = 1.0 / np.log2(np.arange(2, vals.size + 2))
-    gains = (2.0 ** vals - 1.0) * discounts
-    return float(np.sum(gains))
-
-
-def _ndcg_at_k(y_true, y_pred, k):
-    if len(y_true) == 0:
-        return np.nan
-    k_eff = min(int(k), len(y_true))
-    order_pred = np.argsort(np.asarray(y_pred))[::-1][:k_eff]
-    order_ideal = np.argsort(np.asarray(y_true))[::-1][:k_eff]
-    dcg = _dcg(np.asarray(y_true)[order_pred])
-    idcg = _dcg(np.asarray(y_true)[order_ideal])
-    if idcg <= 0:
-        return np.nan
-    return dcg / idcg
+    # One-hot encode CUISINE and CONTEXT straight into uint8 blocks (NaN -> all zeros)
+    rows = np.arange(len(df))
+    for col in ONE_HOT_COLUMNS:
+        codes, values = pd.factorize(df[col], sort=True)
+        ohe = np.zeros((len(df), len(values)), dtype=np.uint8)
+        present = codes >= 0
+        ohe[rows[present], codes[present]] = 1
+        blocks.append(pd.DataFrame(ohe, columns=[f"{col}_{v}" for v in values], index=df.index))
+    return pd.concat(blocks, axis=1)
 
 
 def evaluate_grouped_ranking_metrics(eval_df, k, relevance_threshold=4):
-    ndcg_vals = []
-    hit_vals = []
-    eligible_hit_groups = 0
-
-    for _, group in eval_df.groupby(["user_id", "context"]):
-        y_true = group["rating"].to_numpy(dtype=float)
-        y_pred = group["pred"].to_numpy(dtype=float)
-        if len(y_true) < 2:
-            continue
-
-        ndcg = _ndcg_at_k(y_true, y_pred, k)
-        if not np.isnan(ndcg):
-            ndcg_vals.append(ndcg)
-
-        relevant_mask = y_true >= float(relevance_threshold)
-        if np.any(relevant_mask):
-            eligible_hit_groups += 1
-            top_k_idx = np.argsort(y_pred)[::-1][: min(int(k), len(y_pred))]
-            hit_vals.append(float(np.any(y_true[top_k_idx] >= float(relevance_threshold))))
-
-    ndcg_mean = float(np.mean(ndcg_vals)) if ndcg_vals else float("nan")
-    hit_rate = float(np.mean(hit_vals)) if hit_vals else float("nan")
+    """
+    Mean NDCG@k and Hit@k over (user_id, context) groups with >= 2 rows.
+    Vectorized over all groups at once: one lexsort ranks every group by pred
+    (tied preds rank later rows first) and reduceat sums per group.
+    """
+    k = int(k)
+    threshold = float(relevance_threshold)
+    # Group codes in sorted key order, matching groupby's iteration order.
+    codes = eval_df.groupby(["user_id", "context"]).ngroup().to_numpy()
+    y_true = eval_df["rating"].to_numpy(dtype=float)
+    y_pred = eval_df["pred"].to_numpy(dtype=float)
+    if codes.size == 0:
+        codes = np.zeros(0, dtype=np.int64)
+
+    counts = np.bincount(codes)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if counts.size else counts
+    rank = np.arange(codes.size) - np.repeat(starts, counts)
+    top_k = rank < k
+    discounts = 1.0 / np.log2(rank + 2)
+
+    pos = np.arange(codes.size)
+    by_pred = y_true[np.lexsort((-pos, -y_pred, codes))]
+    by_true = y_true[np.lexsort((-y_true, codes))]
+
+    def per_group_sum(values):
+        return np.add.reduceat(values, starts) if counts.size else np.zeros(0)
+
+    dcg = per_group_sum(np.where(top_k, (np.exp2(by_pred) - 1.0) * discounts, 0.0))
+    idcg = per_group_sum(np.where(top_k, (np.exp2(by_true) - 1.0) * discounts, 0.0))
+    multi = counts >= 2
+    ndcg_ok = multi & (idcg > 0)
+    ndcg_vals = dcg[ndcg_ok] / idcg[ndcg_ok]
+
+    eligible = multi & (per_group_sum((by_true >= threshold).astype(float)) > 0)
+    hits = per_group_sum((top_k & (by_pred >= threshold)).astype(float)) > 0
+    hit_vals = hits[eligible].astype(float)
+
+    ndcg_mean = float(np.mean(ndcg_vals)) if ndcg_vals.size else float("nan")
+    hit_rate = float(np.mean(hit_vals)) if hit_vals.size else float("nan")
     return {
         "ndcg": ndcg_mean,
-        "ndcg_groups": len(ndcg_vals),
+        "ndcg_groups": int(ndcg_vals.size),
         "hit_rate": hit_rate,
-        "hit_groups": len(hit_vals),
-        "eligible_hit_groups": eligible_hit_groups,
+        "hit_groups": int(hit_vals.size),
+        "eligible_hit_groups": int(eligible.sum()),
     }
 
 
 def main():
     # Load data
     print("Loading synthetic ratings...")
-    ratings_df = pd.read_csv(DATA_PATH)
+    ratings_df = pd.read_csv(DATA_PATH, dtype=RATINGS_CSV_DTYPES)
     print(f"Loaded {len(ratings_df)} ratings")
 
     # Load restaurant data
@@ -107,7 +111,7 @@ def main():
     # Engineer features
     print("Engineering features...")
     X = engineer_features(ratings_df, restaurants)
-    y = ratings_df["rating"]
+    y = ratings_df["rating"].astype(np.float32)  # XGBoost keeps labels as float32
     feature_names = X.columns.tolist()
     print(f"Engineered {X.shape[1]} features")
 
@@ -116,19 +120,23 @@ def main():
 
     # Group-wise split by feature signature to reduce leakage from duplicate rows.
     # This ensures identical feature vectors do not appear in both train and test.
-    groups = pd.util.hash_pandas_object(X, index=False).astype(str)
+    # (user_id is not a feature, so the signature is the right boundary; the uint64
+    # row hashes group directly, no per-row string.)
+    groups = pd.util.hash_pandas_object(X, index=False).to_numpy()
     splitter = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
     train_idx, test_idx = next(splitter.split(X, y, groups=groups))
     X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
     y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
 
     print("Training XGBoost model...")
+    # hist makes fit() build a QuantileDMatrix (pre-binned, no float copy of X).
     model = xgb.XGBRegressor(
         n_estimators=100,
         max_depth=6,
         learning_rate=0.1,
         random_state=42,
         objective="reg:squarederror",
+        tree_method="hist",
     )
     model.fit(X_train, y_train)
 
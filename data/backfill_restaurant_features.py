@@ -12,6 +12,18 @@ BOOLEAN_FIELDS = [
 ]
 
 
+# Google price_level: numeric 0..4 or PRICE_LEVEL_* enum strings
+PRICE_TIER_BY_LEVEL = {0: 1, 1: 1, 2: 2, 3: 3, 4: 3}
+PRICE_TIER_BY_TEXT = {
+    "PRICE_LEVEL_FREE": 1,
+    "PRICE_LEVEL_INEXPENSIVE": 1,
+    "PRICE_LEVEL_MODERATE": 2,
+    "PRICE_LEVEL_EXPENSIVE": 3,
+    "PRICE_LEVEL_VERY_EXPENSIVE": 3,
+    **{str(level): tier for level, tier in PRICE_TIER_BY_LEVEL.items()},
+}
+
+
 def map_price_tier(value):
     """
     Normalize either Google enum strings or numeric values to tier 1..3.
@@ -20,29 +32,14 @@ def map_price_tier(value):
         return None
 
     if isinstance(value, int):
-        if value in (0, 1):
-            return 1
-        if value == 2:
-            return 2
-        if value in (3, 4):
-            return 3
-        return None
+        return PRICE_TIER_BY_LEVEL.get(value)
 
     text = str(value).strip().upper()
-    enum_map = {
-        "PRICE_LEVEL_FREE": 1,
-        "PRICE_LEVEL_INEXPENSIVE": 1,
-        "PRICE_LEVEL_MODERATE": 2,
-        "PRICE_LEVEL_EXPENSIVE": 3,
-        "PRICE_LEVEL_VERY_EXPENSIVE": 3,
-    }
-    if text in enum_map:
-        return enum_map[text]
-
-    if text.isdigit():
-        as_int = int(text)
-        return map_price_tier(as_int)
-    return None
+    tier = PRICE_TIER_BY_TEXT.get(text)
+    if tier is None and text.isdigit():
+        # e.g. zero-padded levels; anything outside 0..4 stays None
+        tier = PRICE_TIER_BY_LEVEL.get(int(text))
+    return tier
 
 
 def _to_bool_or_none(value):
@@ -94,21 +91,19 @@ def backfill(limit=None, dry_run=False):
     if limit is not None and limit > 0:
         query += f" LIMIT {int(limit)}"
     cursor.execute(query)
-    rows = cursor.fetchall()
-
-    records = [build_feature_record(row) for row in rows]
-    with_payload = [rec for rec in records if rec["cuisine"] is not None and rec["price_tier"] is not None]
 
-    if dry_run:
-        print(f"[dry-run] operational rows scanned: {len(rows)}")
-        print(f"[dry-run] backfill-ready records: {len(with_payload)}")
-        conn.close()
-        return
-
-    payload = []
-    for rec in with_payload:
-        payload.append(
-            (
+    # Rows stream straight from the SELECT cursor into the upsert as tuples; no
+    # intermediate record lists. Counts are tallied as the generator is consumed.
+    counts = {"scanned": 0, "ready": 0}
+
+    def payload():
+        for row in cursor:
+            counts["scanned"] += 1
+            rec = build_feature_record(row)
+            if rec["cuisine"] is None or rec["price_tier"] is None:
+                continue
+            counts["ready"] += 1
+            yield (
                 rec["place_id"],
                 rec["cuisine"],
                 rec["price_tier"],
@@ -120,9 +115,17 @@ def backfill(limit=None, dry_run=False):
                 rec["has_cocktails"],
                 rec["source"],
             )
-        )
 
-    cursor.executemany(
+    if dry_run:
+        for _ in payload():
+            pass
+        print(f"[dry-run] operational rows scanned: {counts['scanned']}")
+        print(f"[dry-run] backfill-ready records: {counts['ready']}")
+        conn.close()
+        return
+
+    # conn.executemany runs on its own cursor, so `cursor` keeps reading.
+    conn.executemany(
         """
         INSERT INTO restaurant_features (
             place_id, cuisine, price_tier,
@@ -145,15 +148,15 @@ def backfill(limit=None, dry_run=False):
             END,
             updated_at = CURRENT_TIMESTAMP
         """,
-        payload,
+        payload(),
     )
     conn.commit()
 
     cursor.execute("SELECT COUNT(*) AS n FROM restaurant_features")
     total = cursor.fetchone()["n"]
-    print(f"Operational rows scanned: {len(rows)}")
-    print(f"Backfill-ready records: {len(with_payload)}")
-    print(f"Rows upserted into restaurant_features: {len(payload)}")
+    print(f"Operational rows scanned: {counts['scanned']}")
+    print(f"Backfill-ready records: {counts['ready']}")
+    print(f"Rows upserted into restaurant_features: {counts['ready']}")
     print(f"Current restaurant_features row count: {total}")
     conn.close()
 
@@ -4,19 +4,21 @@ DB_PATH = "restaurants.db"
 
 def cleanup_lists():
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM ratings WHERE list_id IN (SELECT id FROM lists)")
-    cursor.execute("DELETE FROM list_restaurants WHERE list_id IN (SELECT id FROM lists)")
-    cursor.execute("DELETE FROM lists")
-    conn.commit()
+    # One transaction: commits once on success, rolls back on error
+    with conn:
+        # processed_ratings references ratings, so it goes first; left behind, its
+        # keys would mark ratings on re-used list ids as already processed.
+        conn.execute("DELETE FROM processed_ratings WHERE list_id IN (SELECT id FROM lists)")
+        conn.execute("DELETE FROM ratings WHERE list_id IN (SELECT id FROM lists)")
+        conn.execute("DELETE FROM list_restaurants WHERE list_id IN (SELECT id FROM lists)")
+        conn.execute("DELETE FROM lists")
     conn.close()
     print("All lists cleaned up.")
 
 def cleanup_invisible_ratings():
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM lists WHERE user_id IS 1") 
-    conn.commit()
+    with conn:
+        conn.execute("DELETE FROM lists WHERE user_id = 1")
     conn.close()
 
 if __name__ == "__main__":
@@ -1,12 +1,17 @@
 import requests
+from requests.adapters import HTTPAdapter
 import sqlite3
 import math
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Tuple, Dict, Any
 import os
 
+from backend.database import last_restaurant_id, index_new_restaurants
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,9 +31,52 @@ BBOX = [37.74802895624222, -122.42248265700066, 37.769249996806195, -122.4080146
 RADIUS_METERS = 100  # Google max is 50,000, but we use small radius for density + overlap.
 MAX_PAGES_PER_QUERY = 3  # Google returns up to 20 results per page, even if I set this to 3 it will only return 1 page.
 REQUEST_DELAY_SEC = 0.1  # Minimum QPS delay.
+# Grid points are fetched concurrently so HTTP round trips overlap; request starts
+# are still spaced REQUEST_DELAY_SEC apart across all workers.
+FETCH_WORKERS = 4
+
+# Keep-alive session: requests reuse pooled TLS connections to the Places API
+# instead of a new handshake per call. No automatic retries: a retried request is
+# billed like any other but would bypass the api_usage counter.
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS))
+
+# journal_mode=WAL persists in the DB file; the rest are per-connection. Under WAL,
+# synchronous=NORMAL fsyncs at checkpoints rather than on every counter commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA cache_size = -64000;",  # ~64MB page cache
+)
+
+
+# Statements run per API request / per batch; constants so each one is a single
+# string the connection's statement cache compiles once.
+USAGE_COUNT_SQL = "SELECT request_count FROM api_usage WHERE usage_month = ?"
+USAGE_INCREMENT_SQL = """
+    INSERT INTO api_usage (usage_month, request_count)
+    VALUES (?, ?)
+    ON CONFLICT(usage_month) DO UPDATE SET
+        request_count = request_count + excluded.request_count
+"""
+INSERT_RESTAURANT_SQL = """
+    INSERT OR IGNORE INTO restaurants (
+        google_place_id, name, latitude, longitude, address, price_level, business_status
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def open_db(check_same_thread: bool = True):
+    # timeout doubles as busy_timeout
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, check_same_thread=check_same_thread)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 
 def create_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = open_db()
     cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS restaurants (
@@ -59,47 +107,76 @@ def current_usage_month() -> str:
     return datetime.utcnow().strftime("%Y-%m")
 
 
+# One connection serves every api_usage read/increment of a run instead of a
+# connect + pragmas + close per API request; each increment still commits on its
+# own so the monthly budget count survives a crash mid-run.
+# Fetch workers share it, so every use holds _usage_lock.
+_usage_conn = None
+_usage_lock = threading.Lock()
+
+
+def _get_usage_conn():
+    global _usage_conn
+    if _usage_conn is None:
+        _usage_conn = open_db(check_same_thread=False)
+    return _usage_conn
+
+
+def close_usage_db():
+    global _usage_conn
+    if _usage_conn is not None:
+        _usage_conn.close()
+        _usage_conn = None
+
+
 def get_monthly_request_count() -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT request_count FROM api_usage WHERE usage_month = ?",
-        (current_usage_month(),),
-    )
-    row = cursor.fetchone()
-    conn.close()
+    with _usage_lock:
+        cursor = _get_usage_conn().cursor()
+        cursor.execute(USAGE_COUNT_SQL, (current_usage_month(),))
+        row = cursor.fetchone()
     return row[0] if row else 0
 
 
-def increment_request_counters(count: int = 1):
+def increment_request_counters(count: int = 1) -> int:
+    """Record `count` API requests; returns the run's request total."""
     global REQUEST_COUNTER
-    REQUEST_COUNTER += count
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     month = current_usage_month()
-    cursor.execute(
-        """
-        INSERT INTO api_usage (usage_month, request_count)
-        VALUES (?, ?)
-        ON CONFLICT(usage_month) DO UPDATE SET
-            request_count = request_count + excluded.request_count
-        """,
-        (month, count),
-    )
-    conn.commit()
-    conn.close()
+    with _usage_lock:
+        REQUEST_COUNTER += count
+        total = REQUEST_COUNTER
+        conn = _get_usage_conn()
+        with conn:
+            conn.execute(USAGE_INCREMENT_SQL, (month, count))
+    return total
+
+
+_pace_lock = threading.Lock()
+_next_request_at = 0.0
+
+
+def wait_for_request_slot():
+    """Block until REQUEST_DELAY_SEC has passed since the previous request started (any thread)."""
+    global _next_request_at
+    with _pace_lock:
+        now = time.monotonic()
+        start = max(now, _next_request_at)
+        _next_request_at = start + REQUEST_DELAY_SEC
+    if start > now:
+        time.sleep(start - now)
 
 
 def generate_grid_points(sw_lat, sw_lng, ne_lat, ne_lng, step_m):
     points = []
+    lat_step = step_m / 111320
     lat = sw_lat
     while lat <= ne_lat:
+        # Longitude step depends only on the row's latitude
+        lng_step = step_m / (111320 * math.cos(math.radians(lat)))
         lng = sw_lng
         while lng <= ne_lng:
             points.append((lat, lng))
-            lng += step_m / (111320 * math.cos(math.radians(lat)))
-        lat += step_m / 111320
+            lng += lng_step
+        lat += lat_step
     return points
 
 
@@ -137,9 +214,10 @@ def fetch_places_nearby(lat: float, lng: float, radius: int) -> List[Dict[str, A
             time.sleep(2)  # Required by Google before using nextPageToken
 
         try:
-            increment_request_counters()
-            logger.info(f"Making API request #{REQUEST_COUNTER}")
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            wait_for_request_slot()
+            request_number = increment_request_counters()
+            logger.info(f"Making API request #{request_number}")
+            response = HTTP_SESSION.post(url, json=payload, headers=headers, timeout=10)
             response.raise_for_status()
             data = response.json()
 
@@ -158,8 +236,6 @@ def fetch_places_nearby(lat: float, lng: float, radius: int) -> List[Dict[str, A
                 logger.error(f"Response content: {response.text}")
             break
 
-        time.sleep(REQUEST_DELAY_SEC)
-
     return all_results
 
 
@@ -172,7 +248,7 @@ def fetch_place_price_level(place_id: str) -> Any:
     }
 
     increment_request_counters()
-    response = requests.get(url, headers=headers, timeout=10)
+    response = HTTP_SESSION.get(url, headers=headers, timeout=10)
     response.raise_for_status()
     data = response.json()
     return data.get("priceLevel")
@@ -223,34 +299,39 @@ def enrich_unique_places_with_price_level(unique_places: List[Dict[str, Any]]):
         time.sleep(REQUEST_DELAY_SEC)
 
 
-def insert_restaurants(places: List[Dict[str, Any]]):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    inserted = 0
+def _restaurant_row(p: Dict[str, Any]) -> Tuple:
+    return (
+        p["id"],
+        p.get("displayName", {}).get("text", "Unnamed").strip(),
+        p["location"]["latitude"],
+        p["location"]["longitude"],
+        p.get("formattedAddress", ""),  # Street address, City, State, ZIP Country
+        p.get("priceLevel"),  # VERY_EXPENSIVE, EXPENSIVE, MODERATE, INEXPENSIVE, NULL
+        p.get("businessStatus", "OPERATIONAL"),  # OPERATIONAL, CLOSED_TEMPORARILY, CLOSED_PERMANENTLY
+    )
 
-    for p in places:
-        place_id = p["id"]
-        name = p.get("displayName", {}).get("text", "Unnamed").strip()
-        lat = p["location"]["latitude"]
-        lng = p["location"]["longitude"] 
-        address = p.get("formattedAddress", "") # Street address, City, State, ZIP Country
-        price_level = p.get("priceLevel")  # VERY_EXPENSIVE, EXPENSIVE, MODERATE, INEXPENSIVE, NULL
-        business_status = p.get("businessStatus", "OPERATIONAL") # OPERATIONAL, CLOSED_TEMPORARILY, CLOSED_PERMANENTLY
 
-        try:
-            cursor.execute("""
-                INSERT OR IGNORE INTO restaurants (
-                    google_place_id, name, latitude, longitude, address, price_level, business_status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (place_id, name, lat, lng, address, price_level, business_status))
-            if cursor.rowcount > 0:
-                inserted += 1
-        except Exception as e:
-            logger.error(f"Failed to insert {place_id}: {e}")
+def insert_restaurants(places: List[Dict[str, Any]]):
+    conn = open_db()
+    rows = [_restaurant_row(p) for p in places]
+
+    # One statement for the batch; UNIQUE(google_place_id) drops places already in
+    # the table, and rowcount counts only the rows actually inserted.
+    with conn:
+        # Hold the write lock from the MAX(id) read through commit, as the API ingest does
+        conn.execute("BEGIN IMMEDIATE")
+        last_id = last_restaurant_id(conn)
+        cursor = conn.executemany(INSERT_RESTAURANT_SQL, rows)
+        inserted = cursor.rowcount
+        if inserted:
+            # Keep search / candidate lookups current for a running API (no restart)
+            index_new_restaurants(conn, last_id)
 
-    conn.commit()
     conn.close()
-    logger.info(f"Inserted {inserted} new restaurants (deduplicated by place_id)")
+    logger.info(
+        f"Inserted {inserted} new restaurants, skipped {len(rows) - inserted} already stored "
+        "(deduplicated by place_id)"
+    )
 
 
 def main():
@@ -258,24 +339,21 @@ def main():
     grid_points = generate_grid_points(*BBOX, step_m=RADIUS_METERS)
     logger.info(f"Generated {len(grid_points)} grid points over bounding box")
 
-    all_places = []
-    for i, (lat, lng) in enumerate(grid_points):
-        logger.info(f"Processing point {i+1}/{len(grid_points)}")
-        results = fetch_places_nearby(lat, lng, RADIUS_METERS)
-        all_places.extend(results)
-
-    # Deduplicate in memory by place ID
-    seen = set()
-    unique_places = []
-    for p in all_places:
-        pid = p["id"]
-        if pid not in seen:
-            seen.add(pid)
-            unique_places.append(p)
+    # Deduplicate by place ID as results arrive; dicts keep insertion order and
+    # map() yields in grid order, so the first-seen copy of each place is kept.
+    places_by_id = {}
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        results_per_point = pool.map(lambda point: fetch_places_nearby(*point, RADIUS_METERS), grid_points)
+        for i, results in enumerate(results_per_point):
+            logger.info(f"Processed point {i+1}/{len(grid_points)}")
+            for p in results:
+                places_by_id.setdefault(p["id"], p)
+    unique_places = list(places_by_id.values())
 
     logger.info(f"Total unique places fetched: {len(unique_places)}")
     enrich_unique_places_with_price_level(unique_places)
     insert_restaurants(unique_places)
+    close_usage_db()
     logger.info(f"Ingestion complete. Total Google Places API requests: {REQUEST_COUNTER}")
 
 
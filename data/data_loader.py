@@ -14,19 +14,35 @@ def _resolve_feature_mode(feature_mode):
     return MODE_CANONICAL_FALLBACK
 
 
-def load_restaurants_from_db(include_location: bool = False, feature_mode: str | None = None):
+def load_restaurants_from_db(include_location: bool = False, feature_mode: str | None = None, conn=None, bbox=None):
     """
     Load operational restaurants with canonical feature columns.
     Feature modes:
       - canonical+fallback (default): prefer canonical `restaurant_features`,
         fallback to `synthetic_attributes`.
       - canonical-only: use only canonical `restaurant_features`.
+    Pass `conn` to reuse a caller-owned connection; it is left open.
+    `bbox` = (min_lat, max_lat, min_lng, max_lng) restricts rows to a lat/lng box
+    via the `restaurants_rtree` index (created by backend init_db).
     """
-    conn = get_db()
+    owns_conn = conn is None
+    if owns_conn:
+        conn = get_db()
     cursor = conn.cursor()
     mode = _resolve_feature_mode(feature_mode)
 
     select_location = ", r.latitude, r.longitude" if include_location else ""
+    bbox_join = ""
+    bbox_filter = ""
+    params = ()
+    if bbox is not None:
+        # R*Tree bounds are rounded outward; keep the exact box on the row itself.
+        bbox_join = "JOIN restaurants_rtree g ON g.id = r.id"
+        bbox_filter = """
+                AND g.max_lat >= ? AND g.min_lat <= ? AND g.max_lng >= ? AND g.min_lng <= ?
+                AND r.latitude BETWEEN ? AND ? AND r.longitude BETWEEN ? AND ?"""
+        min_lat, max_lat, min_lng, max_lng = bbox
+        params = (min_lat, max_lat, min_lng, max_lng) * 2
     if mode == MODE_CANONICAL_ONLY:
         cursor.execute(
             f"""
@@ -43,12 +59,16 @@ def load_restaurants_from_db(include_location: bool = False, feature_mode: str |
                 rf.quiet_ambiance AS quiet_ambiance,
                 rf.has_cocktails AS has_cocktails
             FROM restaurants r
+            {bbox_join}
             JOIN restaurant_features rf ON r.id = rf.place_id
             WHERE
                 r.business_status = 'OPERATIONAL'
                 AND rf.cuisine IS NOT NULL
                 AND rf.price_tier IS NOT NULL
-            """
+                {bbox_filter}
+            ORDER BY r.id
+            """,
+            params,
         )
     else:
         cursor.execute(
@@ -66,14 +86,19 @@ def load_restaurants_from_db(include_location: bool = False, feature_mode: str |
                 COALESCE(rf.quiet_ambiance, s.quiet_ambiance) AS quiet_ambiance,
                 COALESCE(rf.has_cocktails, s.has_cocktails) AS has_cocktails
             FROM restaurants r
+            {bbox_join}
             LEFT JOIN restaurant_features rf ON r.id = rf.place_id
             LEFT JOIN synthetic_attributes s ON r.id = s.place_id
             WHERE
                 r.business_status = 'OPERATIONAL'
                 AND COALESCE(rf.cuisine, s.cuisine) IS NOT NULL
                 AND COALESCE(rf.price_tier, s.price_tier) IS NOT NULL
-            """
+                {bbox_filter}
+            ORDER BY r.id
+            """,
+            params,
         )
     restaurants = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    if owns_conn:
+        conn.close()
     return restaurants
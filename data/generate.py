@@ -1,4 +1,5 @@
 # synthetic/generate.py
+import csv
 import random
 import argparse
 from .personas import create_persona, sample_user_context
@@ -7,6 +8,8 @@ from .data_loader import load_restaurants_from_db
 import pandas as pd
 from data.ML_recs.train_model import engineer_features
 
+RATING_COLUMNS = ["user_id", "context", "restaurant_id", "rating"]
+
 def _keep_recommendation(pattern_counts, context, restaurant_id, duplicate_penalty):
     """
     Softly downweight repeated (context, restaurant) pairs to improve feature diversity.
@@ -33,6 +36,8 @@ def main():
     parser.add_argument("--strictness-jitter", type=float, default=0.10)
     parser.add_argument("--duplicate-penalty", type=float, default=0.70)
     parser.add_argument("--output", type=str, default="synthetic_ratings1.csv")
+    parser.add_argument("--diagnostics", action="store_true",
+                        help="Read the output back and print distribution/duplicate diagnostics")
     args = parser.parse_args()
 
     # Seed everything
@@ -48,51 +53,52 @@ def main():
     users = [create_persona(i) for i in range(args.num_users)]
     print(f"Created {len(users)} user personas")
 
-    # Main simulation loop
-    dataset = []
+    # Main simulation loop; rows stream straight to the CSV instead of a list in memory
+    rows_written = 0
     context_counts = {}
     pattern_counts = {}
 
-    for user in users:
-        for _ in range(args.sessions_per_user):
-            context = sample_user_context(user)
-            context_counts[context] = context_counts.get(context, 0) + 1
-            try:
-                recommendations = simulate_session(
-                    user,
-                    context,
-                    restaurants,
-                    max_questions=args.max_questions,
-                    top_k=args.top_k,
-                    rating_probability=args.rating_probability,
-                    surprise_rate=args.surprise_rate,
-                    preference_drift=args.preference_drift,
-                    exploration_rate=args.exploration_rate,
-                    strictness_jitter=args.strictness_jitter,
-                )
-                if not recommendations:
-                    continue
-                for restaurant_id, rating in recommendations:
-                    if not _keep_recommendation(
-                        pattern_counts,
+    with open(args.output, "w", newline="") as output_file:
+        writer = csv.writer(output_file, lineterminator="\n")  # same layout as DataFrame.to_csv
+        writer.writerow(RATING_COLUMNS)
+        for user in users:
+            for _ in range(args.sessions_per_user):
+                context = sample_user_context(user)
+                context_counts[context] = context_counts.get(context, 0) + 1
+                try:
+                    recommendations = simulate_session(
+                        user,
                         context,
-                        restaurant_id,
-                        duplicate_penalty=args.duplicate_penalty,
-                    ):
+                        restaurants,
+                        max_questions=args.max_questions,
+                        top_k=args.top_k,
+                        rating_probability=args.rating_probability,
+                        surprise_rate=args.surprise_rate,
+                        preference_drift=args.preference_drift,
+                        exploration_rate=args.exploration_rate,
+                        strictness_jitter=args.strictness_jitter,
+                    )
+                    if not recommendations:
                         continue
-                    dataset.append({
-                        "user_id": user["user_id"],
-                        "context": context,
-                        "restaurant_id": restaurant_id,
-                        "rating": rating
-                    })
-            except Exception as e:
-                continue  # silently skip errors
+                    for restaurant_id, rating in recommendations:
+                        if not _keep_recommendation(
+                            pattern_counts,
+                            context,
+                            restaurant_id,
+                            duplicate_penalty=args.duplicate_penalty,
+                        ):
+                            continue
+                        writer.writerow((user["user_id"], context, restaurant_id, rating))
+                        rows_written += 1
+                except Exception as e:
+                    continue  # silently skip errors
             
-    # Save
-    df = pd.DataFrame(dataset)
-    df.to_csv(args.output, index=False)
-    print(f"Saved {len(df)} ratings to {args.output}")
+    print(f"Saved {rows_written} ratings to {args.output}")
+    if not args.diagnostics:
+        return
+    # Diagnostics read the file back (user_id stays a string, as in training) and
+    # featurize every row, which can outweigh generation itself on large runs
+    df = pd.read_csv(args.output, dtype={"user_id": str, "context": str})
     print_diagnostics(df, restaurants, context_counts)
 
 def print_diagnostics(df, restaurants, context_counts):
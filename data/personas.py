@@ -1,4 +1,5 @@
 import random
+from itertools import accumulate
 
 # Real cuisines from your tag generator (excluding "others")
 REAL_CUISINES = [
@@ -28,6 +29,12 @@ def _sample_context_preferences():
     total = sum(raw) or 1.0
     return {ctx: weight / total for ctx, weight in zip(CONTEXTS, raw)}
 
+def _context_cum_weights(context_preferences):
+    """
+    (contexts, cumulative weights) for random.choices, built once per persona.
+    """
+    return list(context_preferences.keys()), list(accumulate(context_preferences.values()))
+
 def create_persona(user_id: int):
     """
     Generate a synthetic user persona with base preferences and context modifiers.
@@ -88,13 +95,17 @@ def create_persona(user_id: int):
         }
     }
     
+    strictness = round(random.uniform(0.35, 0.9), 3)
+    generosity_bias = round(random.gauss(0.0, 0.22), 3)
+    context_preferences = _sample_context_preferences()
     return {
         "user_id": f"user_{user_id:03d}",
         "base_prefs": base_prefs,
         "context_modifiers": context_modifiers,
-        "strictness": round(random.uniform(0.35, 0.9), 3),
-        "generosity_bias": round(random.gauss(0.0, 0.22), 3),
-        "context_preferences": _sample_context_preferences(),
+        "strictness": strictness,
+        "generosity_bias": generosity_bias,
+        "context_preferences": context_preferences,
+        "context_cum_weights": _context_cum_weights(context_preferences),
     }
 
 def apply_context_modifiers(user_prefs, context_name):
@@ -139,6 +150,9 @@ def sample_user_context(user_prefs):
     if not context_preferences:
         return random.choice(CONTEXTS)
 
-    contexts = list(context_preferences.keys())
-    probs = list(context_preferences.values())
-    return random.choices(contexts, weights=probs, k=1)[0]
+    # Same single draw as weights=..., without re-summing the weights every session
+    cum_weights = user_prefs.get("context_cum_weights")
+    if cum_weights is None:
+        cum_weights = _context_cum_weights(context_preferences)
+    contexts, cum = cum_weights
+    return random.choices(contexts, cum_weights=cum, k=1)[0]
@@ -1,6 +1,9 @@
 import random
 import math
 import hashlib
+import heapq
+from itertools import accumulate
+from functools import lru_cache
 from .personas import apply_context_modifiers
 
 BOOLEAN_ATTRS = [
@@ -22,15 +25,23 @@ CONTEXT_WEIGHTS = {
     "Late Night Eats": {"price": 0.20, "cuisine": 0.35, "ambiance": 0.45, "popularity": 0.15},
 }
 
+# Rating drawn when a surprise fires; cumulative weights built once for random.choices.
+SURPRISE_RATINGS = [1, 2, 3, 4, 5]
+_SURPRISE_CUM_WEIGHTS = list(accumulate([0.22, 0.20, 0.16, 0.20, 0.22]))
+
 def sigmoid(x):
     return 1 / (1 + math.exp(-max(-80, min(80, x))))
 
+# Keys are "pop:<id>"/"qual:<id>", so the cache is bounded by 2 x restaurants.
+@lru_cache(maxsize=None)
 def _stable_unit_random(key: str) -> float:
     digest = hashlib.md5(key.encode("utf-8")).hexdigest()
     return int(digest[:8], 16) / 0xFFFFFFFF
 
 def sample_answer(attr, user_prefs, context_modifier, noise=0.2):
-    adjusted_prefs = apply_context_modifiers(user_prefs, "")  
+    # Answers start from the user's base preferences (context_modifier is applied
+    # explicitly below); read-only, so no adjusted copy is needed.
+    adjusted_prefs = user_prefs["base_prefs"]
     
     if attr == "price_tier":
         base = adjusted_prefs["price_bias"]
@@ -98,27 +109,39 @@ def _apply_session_drift(adjusted_prefs, drift_strength):
         )
     return drifted
 
-def compute_match_score(restaurant, adjusted_prefs, context_name):
+def _match_scorer(adjusted_prefs, context_name):
+    """
+    compute_match_score bound to one session's prefs/context: the weight, affinity and
+    ambiance-pref lookups happen once here instead of once per candidate.
+    """
     weights = _context_weights(context_name)
-
-    price_tier = restaurant.get("price_tier", 2)
-    price_match = max(0.0, 1.0 - abs(price_tier - adjusted_prefs["price_bias"]) / 2.0)
-    cuisine_match = adjusted_prefs["cuisine_affinities"].get(restaurant.get("cuisine"), 0.25)
-
-    ambiance_match = 0.0
+    w_price, w_cuisine, w_ambiance = weights["price"], weights["cuisine"], weights["ambiance"]
+    denom = max(0.0001, w_price + w_cuisine + w_ambiance)
+    price_bias = adjusted_prefs["price_bias"]
+    cuisine_affinities = adjusted_prefs["cuisine_affinities"]
+    ambiance_terms = []
     for attr in BOOLEAN_ATTRS:
         pref = adjusted_prefs["ambiance_prefs"].get(attr, 0.5)
-        has_attr = bool(restaurant.get(attr, False))
-        ambiance_match += pref if has_attr else (1.0 - pref) * 0.3
-    ambiance_match /= len(BOOLEAN_ATTRS)
-
-    score = (
-        weights["price"] * price_match
-        + weights["cuisine"] * cuisine_match
-        + weights["ambiance"] * ambiance_match
-    )
-    denom = max(0.0001, weights["price"] + weights["cuisine"] + weights["ambiance"])
-    return max(0.0, min(1.0, score / denom))
+        ambiance_terms.append((attr, pref, (1.0 - pref) * 0.3))
+    n_attrs = len(BOOLEAN_ATTRS)
+
+    def score(restaurant):
+        price_tier = restaurant.get("price_tier", 2)
+        price_match = max(0.0, 1.0 - abs(price_tier - price_bias) / 2.0)
+        cuisine_match = cuisine_affinities.get(restaurant.get("cuisine"), 0.25)
+
+        ambiance_match = 0.0
+        for attr, if_present, if_absent in ambiance_terms:
+            ambiance_match += if_present if restaurant.get(attr, False) else if_absent
+        ambiance_match /= n_attrs
+
+        total = w_price * price_match + w_cuisine * cuisine_match + w_ambiance * ambiance_match
+        return max(0.0, min(1.0, total / denom))
+
+    return score
+
+def compute_match_score(restaurant, adjusted_prefs, context_name):
+    return _match_scorer(adjusted_prefs, context_name)(restaurant)
 
 def _answer_compatibility(attr, restaurant, answer):
     if attr == "price_tier":
@@ -129,51 +152,79 @@ def _answer_compatibility(attr, restaurant, answer):
         return 1.0 if bool(restaurant.get(attr, False)) == bool(answer) else 0.2
     return 0.5
 
+_MISSING = object()
+
 def _soft_filter_candidates(candidates, attr, answer, strictness):
+    # Compatibility depends only on the candidate's value for `attr`, so keep
+    # probabilities are computed once per distinct value (a handful) rather than
+    # per candidate. Still one random() draw per candidate, in order.
+    keep_prob_by_value = {}
     retained = []
     for candidate in candidates:
-        compat = _answer_compatibility(attr, candidate, answer)
-        keep_prob = max(0.05, min(0.98, (1.0 - strictness) * 0.75 + strictness * compat))
+        value = candidate.get(attr, _MISSING)
+        keep_prob = keep_prob_by_value.get(value)
+        if keep_prob is None:
+            compat = _answer_compatibility(attr, candidate, answer)
+            keep_prob = max(0.05, min(0.98, (1.0 - strictness) * 0.75 + strictness * compat))
+            keep_prob_by_value[value] = keep_prob
         if random.random() < keep_prob:
             retained.append(candidate)
     return retained
 
+def _has_multiple_values(candidates, attr):
+    """True once two candidates that carry `attr` disagree on it."""
+    first = _MISSING
+    for c in candidates:
+        if attr in c:
+            value = c[attr]
+            if first is _MISSING:
+                first = value
+            elif value != first:
+                return True
+    return False
+
 def _weighted_sample_without_replacement(items, k):
     if k <= 0 or not items:
         return []
-    pool = items[:]
+    # Clamp weights once up front; the picks (and random() draws) are unchanged.
+    pool = [item for item, _ in items]
+    weights = [max(0.001, weight) for _, weight in items]
     chosen = []
     for _ in range(min(k, len(pool))):
-        total = sum(max(0.001, weight) for _, weight in pool)
+        total = sum(weights)
         cutoff = random.random() * total
         running = 0.0
         selected_idx = 0
-        for idx, (_, weight) in enumerate(pool):
-            running += max(0.001, weight)
+        for idx, weight in enumerate(weights):
+            running += weight
             if running >= cutoff:
                 selected_idx = idx
                 break
-        chosen_item, _ = pool.pop(selected_idx)
-        chosen.append(chosen_item)
+        weights.pop(selected_idx)
+        chosen.append(pool.pop(selected_idx))
     return chosen
 
-def _expose_candidates(candidates, adjusted_prefs, context_name, top_k, explore_rate=0.22):
+def _expose_candidates(candidates, adjusted_prefs, context_name, top_k, explore_rate=0.22, match_scorer=None):
+    if match_scorer is None:
+        match_scorer = _match_scorer(adjusted_prefs, context_name)
     scored = []
     for candidate in candidates:
-        match = compute_match_score(candidate, adjusted_prefs, context_name)
+        match = match_scorer(candidate)
         popularity = _restaurant_popularity(candidate)
         quality = _restaurant_quality(candidate)
         score = 0.58 * match + 0.20 * popularity + 0.14 * quality + random.gauss(0.0, 0.05)
         scored.append((candidate, score))
 
-    scored.sort(key=lambda x: x[1], reverse=True)
     shortlist_size = max(top_k + 2, min(20, len(scored)))
-    shortlist = scored[:shortlist_size]
+    # Only the shortlist and the exploration tail are ever read, so rank just those
+    # (nlargest orders ties exactly like a stable reverse sort).
+    ranked = heapq.nlargest(shortlist_size + 24, scored, key=lambda x: x[1])
+    shortlist = ranked[:shortlist_size]
     selected = _weighted_sample_without_replacement(shortlist, top_k)
 
     # Controlled exploration improves restaurant/context coverage in training data.
     if len(scored) > shortlist_size and random.random() < max(0.0, min(1.0, explore_rate)):
-        tail = scored[shortlist_size:min(len(scored), shortlist_size + 24)]
+        tail = ranked[shortlist_size:]
         tail_pick = _weighted_sample_without_replacement(tail, 1)
         if tail_pick:
             if selected:
@@ -194,8 +245,9 @@ def _utility_to_rating(utility):
         return 4
     return 5
 
-def generate_rating(restaurant, adjusted_prefs, context_name, generosity_bias=0.0, surprise_rate=0.08, mood=0.0):
-    match_score = compute_match_score(restaurant, adjusted_prefs, context_name)
+def generate_rating(restaurant, adjusted_prefs, context_name, generosity_bias=0.0, surprise_rate=0.08, mood=0.0, match_score=None):
+    if match_score is None:
+        match_score = compute_match_score(restaurant, adjusted_prefs, context_name)
     quality = _restaurant_quality(restaurant)
     popularity = _restaurant_popularity(restaurant)
 
@@ -212,7 +264,7 @@ def generate_rating(restaurant, adjusted_prefs, context_name, generosity_bias=0.
 
     # Occasional contradictory behavior for robustness.
     if random.random() < surprise_rate:
-        rating = random.choices([1, 2, 3, 4, 5], weights=[0.22, 0.20, 0.16, 0.20, 0.22])[0]
+        rating = random.choices(SURPRISE_RATINGS, cum_weights=_SURPRISE_CUM_WEIGHTS)[0]
     return rating
 
 def simulate_session(
@@ -240,8 +292,7 @@ def simulate_session(
             continue
 
         attr = QUESTION_ORDER[question_idx % len(QUESTION_ORDER)]
-        unique_vals = {c.get(attr) for c in candidates if attr in c}
-        if len(unique_vals) <= 1:
+        if not _has_multiple_values(candidates, attr):
             continue
 
         context_mod = user_prefs["context_modifiers"].get(context_name, {})
@@ -252,17 +303,19 @@ def simulate_session(
         if filtered:
             candidates = filtered
 
+    match_scorer = _match_scorer(adjusted_prefs, context_name)
     exposed = _expose_candidates(
         candidates,
         adjusted_prefs,
         context_name,
         top_k,
         explore_rate=exploration_rate,
+        match_scorer=match_scorer,
     )
 
     recommendations = []
     for restaurant in exposed:
-        match_score = compute_match_score(restaurant, adjusted_prefs, context_name)
+        match_score = match_scorer(restaurant)
         p_rate = max(0.05, min(0.95, rating_probability + 0.25 * (match_score - 0.5)))
         if random.random() > p_rate:
             continue
@@ -273,6 +326,7 @@ def simulate_session(
             generosity_bias=generosity_bias,
             surprise_rate=surprise_rate,
             mood=mood,
+            match_score=match_score,
         )
         recommendations.append((restaurant["id"], rating))
 
@@ -1,6 +1,7 @@
 import sqlite3
 import random
 import os
+from itertools import accumulate
 from pathlib import Path
 from ..backend.database import get_db
 
@@ -9,6 +10,14 @@ from ..backend.database import get_db
 DB_PATH = "data/restaurants.db"
 RANDOM_SEED = 42
 
+INSERT_SYNTHETIC_SQL = """
+    INSERT OR REPLACE INTO synthetic_attributes
+    (place_id, cuisine, price_tier, price_is_synthetic,
+    has_outdoor_seating, is_vegan_friendly, good_for_dates,
+    good_for_groups, quiet_ambiance, has_cocktails)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 # Cuisine weights (urban mix)
 CUISINE_WEIGHTS = {
     "mexican": 0.15,
@@ -28,6 +37,11 @@ CUISINE_WEIGHTS = {
     "ethiopian": 0.02,
     "others": 0.05
 }
+
+# Fallback price tiers for rows without a usable Google price level
+SYNTHETIC_PRICE_TIERS = [1, 2, 3]
+_PRICE_TIER_CUM_WEIGHTS = list(accumulate([0.4, 0.4, 0.2]))
+
 def query_operational_restaurants(cursor):
     # Expand for weighted random choice
     cuisine_pool = []
@@ -68,12 +82,12 @@ def generate_synthetic_attributes(operational_restaurants, cuisine_pool):
         # Handle price
         if price_str is None:
             # Generate synthetic price tier
-            tier = random.choices([1, 2, 3], weights=[0.4, 0.4, 0.2])[0]
+            tier = random.choices(SYNTHETIC_PRICE_TIERS, cum_weights=_PRICE_TIER_CUM_WEIGHTS)[0]
             price_is_synth = True
         else:
             tier, price_is_synth = map_price_tier(price_str)
             if tier is None:  # fallback for unknown strings
-                tier = random.choices([1, 2, 3], weights=[0.4, 0.4, 0.2])[0]
+                tier = random.choices(SYNTHETIC_PRICE_TIERS, cum_weights=_PRICE_TIER_CUM_WEIGHTS)[0]
                 price_is_synth = None
 
         # Assign cuisine
@@ -127,16 +141,10 @@ def main():
     # Generate synthetic tags
     synth_records = generate_synthetic_attributes(operational_restaurants, cuisine_pool)
 
-    # Insert into synthetic_attributes table in db
-    cursor.executemany("""
-        INSERT OR REPLACE INTO synthetic_attributes 
-        (place_id, cuisine, price_tier, price_is_synthetic,
-        has_outdoor_seating, is_vegan_friendly, good_for_dates,
-        good_for_groups, quiet_ambiance, has_cocktails)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, synth_records)
-
-    conn.commit()
+    # Insert into synthetic_attributes table in db (one transaction, rolled back on error;
+    # get_db already sets synchronous=NORMAL/temp_store/cache_size, and the file is WAL)
+    with conn:
+        conn.executemany(INSERT_SYNTHETIC_SQL, synth_records)
     print(f"Inserted {len(synth_records)} synthetic records.")
     conn.close()
 
@@ -12,6 +12,10 @@ FIELDS = [
     "has_cocktails",
 ]
 
+FIELD_NULL_COUNTS = ",\n            ".join(
+    f"SUM(CASE WHEN rf.{field} IS NULL THEN 1 ELSE 0 END) AS {field}_nulls" for field in FIELDS
+)
+
 
 def _pct(num, den):
     if not den:
@@ -19,69 +23,63 @@ def _pct(num, den):
     return 100.0 * float(num) / float(den)
 
 
-def validate():
+def collect():
+    """
+    Run the validation counts and return them as a dict (no printing), so callers
+    can inspect or compare the numbers without re-querying.
+    """
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute("SELECT COUNT(*) AS n FROM restaurants WHERE business_status = 'OPERATIONAL'")
-    operational_total = cur.fetchone()["n"]
-
+    # Every count comes from one pass over the operational rows; place_id is the
+    # restaurant_features primary key, so the LEFT JOIN keeps one row per restaurant.
     cur.execute(
-        """
-        SELECT COUNT(*) AS n
+        f"""
+        SELECT
+            COUNT(*) AS operational_total,
+            COUNT(rf.place_id) AS with_canonical,
+            SUM(CASE WHEN rf.cuisine IS NULL OR rf.price_tier IS NULL THEN 1 ELSE 0 END) AS missing_required,
+            {FIELD_NULL_COUNTS}
         FROM restaurants r
-        JOIN restaurant_features rf ON r.id = rf.place_id
+        LEFT JOIN restaurant_features rf ON r.id = rf.place_id
         WHERE r.business_status = 'OPERATIONAL'
         """
     )
-    with_canonical = cur.fetchone()["n"]
+    row = cur.fetchone()
+    conn.close()
 
-    cur.execute(
-        """
-        SELECT COUNT(*) AS n
-        FROM restaurants r
-        LEFT JOIN restaurant_features rf ON r.id = rf.place_id
-        WHERE r.business_status = 'OPERATIONAL' AND rf.place_id IS NULL
-        """
-    )
-    missing_rows = cur.fetchone()["n"]
+    operational_total = row["operational_total"]
+    with_canonical = row["with_canonical"]
+    return {
+        "operational_total": operational_total,
+        "with_canonical": with_canonical,
+        "missing_rows": operational_total - with_canonical,  # one joined row per restaurant
+        "missing_required": row["missing_required"] or 0,
+        "null_counts": {field: row[f"{field}_nulls"] or 0 for field in FIELDS},
+    }
+
+
+def report(result):
+    operational_total = result["operational_total"]
+    with_canonical = result["with_canonical"]
+    missing_rows = result["missing_rows"]
 
     print("Canonical restaurant_features validation")
     print(f"Operational restaurants: {operational_total}")
     print(f"Operational rows with canonical record: {with_canonical} ({_pct(with_canonical, operational_total):.1f}%)")
     print(f"Operational rows missing canonical record: {missing_rows} ({_pct(missing_rows, operational_total):.1f}%)")
 
-    for field in FIELDS:
-        cur.execute(
-            f"""
-            SELECT
-                SUM(CASE WHEN rf.{field} IS NULL THEN 1 ELSE 0 END) AS null_count,
-                COUNT(*) AS total
-            FROM restaurants r
-            LEFT JOIN restaurant_features rf ON r.id = rf.place_id
-            WHERE r.business_status = 'OPERATIONAL'
-            """
-        )
-        row = cur.fetchone()
-        null_count = row["null_count"] or 0
-        total = row["total"] or 0
-        print(f"{field}: null_or_missing={null_count} ({_pct(null_count, total):.1f}%)")
+    for field, null_count in result["null_counts"].items():
+        print(f"{field}: null_or_missing={null_count} ({_pct(null_count, operational_total):.1f}%)")
 
     # Key readiness signal for canonical-only cutover.
-    cur.execute(
-        """
-        SELECT COUNT(*) AS n
-        FROM restaurants r
-        LEFT JOIN restaurant_features rf ON r.id = rf.place_id
-        WHERE
-            r.business_status = 'OPERATIONAL'
-            AND (rf.cuisine IS NULL OR rf.price_tier IS NULL)
-        """
-    )
-    missing_required = cur.fetchone()["n"]
-    print(f"Missing required canonical fields (cuisine or price_tier): {missing_required}")
+    print(f"Missing required canonical fields (cuisine or price_tier): {result['missing_required']}")
 
-    conn.close()
+
+def validate():
+    result = collect()
+    report(result)
+    return result
 
 
 if __name__ == "__main__":